@@ -0,0 +1,85 @@
+# Per-request overhead of the middleware stack: nested wrappers vs. the flattened pipeline.
+# Run with: python -m benchmarks.bench_middleware
+import timeit
+
+from seraphim import API, Middleware, Request
+
+from .common import call, per_second
+
+NUMBER = 50_000
+QUICK = {"number": 5_000}
+REPEAT = 7
+DEPTHS = (0, 1, 2, 5, 10)
+
+
+class RequestHookMiddleware(Middleware):
+    def process_request(self, req):
+        req.environ["seen"] = True
+
+
+def _environ():
+    return {
+        "REQUEST_METHOD": "GET",
+        "PATH_INFO": "/",
+        "QUERY_STRING": "",
+        "SERVER_NAME": "testserver",
+        "SERVER_PORT": "80",
+    }
+
+
+def _api(depth):
+    api = API()
+
+    @api.route("/")
+    def index(req, resp):
+        resp.text = "Hello"
+
+    for _ in range(depth):
+        api.add_middleware(RequestHookMiddleware)
+    return api
+
+
+def run(number=NUMBER, depths=DEPTHS):
+    results = {}
+    for depth in depths:
+        api = _api(depth)
+        nested = min(
+            timeit.repeat(
+                lambda: api.middleware.handle_request(Request(_environ())),
+                number=number,
+                repeat=REPEAT,
+            )
+        )
+        flat = min(
+            timeit.repeat(
+                lambda: api.run_pipeline(Request(_environ())), number=number, repeat=REPEAT
+            )
+        )
+        results[depth] = {
+            "nested_us": nested / number * 1e6,
+            "pipeline_us": flat / number * 1e6,
+            # the whole WSGI cycle through API.__call__
+            "requests_per_sec": per_second(lambda: call(api, "/"), number, REPEAT),
+        }
+    return results
+
+
+def main():
+    results = run()
+    base = results[DEPTHS[0]]
+    print(
+        f"{'depth':>5} {'nested us':>10} {'overhead':>9} {'pipeline us':>12} {'overhead':>9} "
+        f"{'req/s':>10}"
+    )
+    for depth, result in results.items():
+        print(
+            f"{depth:>5} {result['nested_us']:>10.2f} "
+            f"{result['nested_us'] - base['nested_us']:>+9.2f} "
+            f"{result['pipeline_us']:>12.2f} "
+            f"{result['pipeline_us'] - base['pipeline_us']:>+9.2f} "
+            f"{result['requests_per_sec']:>10,.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# Throughput of the ORM operations on tables of growing size (books with an author FK).
+# Run with: python -m benchmarks.bench_orm [rows ...]
+import os
+import random
+import sys
+import tempfile
+import time
+
+from seraphim import Column, Database, ForeignKey, Table
+
+ROW_COUNTS = (1_000, 10_000, 100_000)
+QUICK = {"row_counts": (1_000,)}
+AUTHORS = 100
+SAVES = 1_000
+LOOKUPS = 2_000
+FILTERS = 200
+
+
+class Author(Table):
+    name = Column(str)
+    age = Column(int)
+
+
+class Book(Table):
+    title = Column(str)
+    published = Column(bool)
+    author = ForeignKey(Author)
+
+
+def _timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def _bench(db, rows):
+    db.create(Author)
+    db.create(Book)
+    authors = [Author(name=f"Author {index}", age=20 + index % 60) for index in range(AUTHORS)]
+    db.bulk_save(authors)
+    books = [
+        Book(title=f"Book {index}", published=index % 2 == 0, author=authors[index % AUTHORS])
+        for index in range(rows)
+    ]
+    bulk_save = _timed(lambda: db.bulk_save(books))
+
+    extra = [Book(title="Extra", published=True, author=authors[0]) for _ in range(SAVES)]
+    save = _timed(lambda: [db.save(book) for book in extra])
+
+    ids = [random.randint(1, rows) for _ in range(LOOKUPS)]
+    get_by_id = _timed(lambda: [db.get_by_id(Book, id) for id in ids])
+
+    author_ids = [random.randint(1, AUTHORS) for _ in range(FILTERS)]
+    filter_ = _timed(lambda: [db.filter(Book, author=id, published=True) for id in author_ids])
+
+    get_all = _timed(lambda: db.get_all(Book))
+    iterate = _timed(lambda: sum(1 for _ in db.iter_all(Book)))
+    raw = _timed(lambda: db.get_all(Book, raw=True))
+    return {
+        "bulk_save_rows_per_sec": rows / bulk_save,
+        "save_per_sec": SAVES / save,
+        "get_by_id_per_sec": LOOKUPS / get_by_id,
+        "filter_per_sec": FILTERS / filter_,
+        "get_all_seconds": get_all,
+        "iter_all_seconds": iterate,
+        "get_all_raw_seconds": raw,
+    }
+
+
+def run(row_counts=ROW_COUNTS):
+    random.seed(0)
+    results = {}
+    for rows in row_counts:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db = Database(os.path.join(tmp_dir, "bench.db"))
+            results[rows] = _bench(db, rows)
+            db.close()
+    return results
+
+
+def main():
+    row_counts = tuple(int(arg) for arg in sys.argv[1:]) or ROW_COUNTS
+    for rows, result in run(row_counts).items():
+        print(f"{rows:,} books")
+        for name, value in result.items():
+            print(f"{name:>24}: {value:>14,.3f}")
+
+
+if __name__ == "__main__":
+    main()
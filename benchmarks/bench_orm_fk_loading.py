@@ -0,0 +1,78 @@
+# Query count and time for loading rows with a foreign key, per FK loading strategy.
+# Run with: python -m benchmarks.bench_orm_fk_loading [rows]
+import os
+import sys
+import tempfile
+import time
+
+from seraphim import Column, Database, ForeignKey, Table
+
+ROWS = 100_000
+QUICK = {"rows": 10_000}
+AUTHORS = 1_000
+
+
+class Author(Table):
+    name = Column(str)
+    age = Column(int)
+
+
+class Book(Table):
+    title = Column(str)
+    published = Column(bool)
+    author = ForeignKey(Author)
+
+
+def create_dataset(db, rows=ROWS, authors=AUTHORS):
+    db.create(Author)
+    db.create(Book)
+    with db.connection() as conn:
+        conn.executemany(
+            "INSERT INTO author (name, age) VALUES (?, ?)",
+            [(f"Author {i}", 20 + i % 60) for i in range(authors)],
+        )
+        conn.executemany(
+            "INSERT INTO book (title, published, author_id) VALUES (?, ?, ?)",
+            [(f"Book {i}", i % 2, 1 + i % authors) for i in range(rows)],
+        )
+        conn.commit()
+
+
+def _strategies(db):
+    return {
+        # lazy proxies touched one by one == the former one-query-per-row behaviour
+        "lazy (N+1)": lambda: [book.author.name for book in db.get_all(Book, lazy=True)],
+        "prefetch_related": lambda: [book.author.name for book in db.get_all(Book)],
+        "select_related": lambda: [
+            book.author.name for book in db.get_all(Book, select_related=("author",))
+        ],
+    }
+
+
+def run(rows=ROWS):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = Database(os.path.join(tmp_dir, "bench.db"))
+        create_dataset(db, rows=rows)
+        for name, load in _strategies(db).items():
+            queries = []
+            db.conn.set_trace_callback(queries.append)
+            start = time.perf_counter()
+            names = load()
+            seconds = time.perf_counter() - start
+            db.conn.set_trace_callback(None)
+            assert len(names) == rows
+            results[name] = {"queries": len(queries), "seconds": seconds}
+        db.close()
+    return results
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else ROWS
+    print(f"{rows:,} books, {AUTHORS:,} authors")
+    for name, result in run(rows).items():
+        print(f"{name:>18}: {result['queries']:>8,} queries {result['seconds']:>8.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# Memory per loaded row and load time: dict-backed Table instances vs raw namedtuple rows.
+# Run with: python -m benchmarks.bench_orm_memory [rows]
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from seraphim import Column, Database, Table
+
+ROWS = 100_000
+QUICK = {"rows": 10_000}
+
+
+class Author(Table):
+    name = Column(str)
+    age = Column(int)
+
+
+def create_dataset(db, rows=ROWS):
+    db.create(Author)
+    with db.connection() as conn:
+        conn.executemany(
+            "INSERT INTO author (name, age) VALUES (?, ?)",
+            [(f"Author {i}", 20 + i % 60) for i in range(rows)],
+        )
+        conn.commit()
+
+
+def _modes(db):
+    return {
+        "Table instances": lambda: db.get_all(Author),
+        "raw=True": lambda: db.get_all(Author, raw=True),
+    }
+
+
+def run(rows=ROWS):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = Database(os.path.join(tmp_dir, "bench.db"))
+        create_dataset(db, rows=rows)
+        for name, load in _modes(db).items():
+            tracemalloc.start()
+            start = time.perf_counter()
+            result = load()
+            seconds = time.perf_counter() - start
+            size, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            assert len(result) == rows
+            del result
+            results[name] = {"bytes_per_row": size / rows, "seconds": seconds}
+        db.close()
+    return results
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else ROWS
+    print(f"{rows:,} authors")
+    for name, result in run(rows).items():
+        print(f"{name:>16}: {result['bytes_per_row']:>8.0f} bytes/row {result['seconds']:>8.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# Compares the native Request/Response pair with the former WebOb based path.
+# Run with: python -m benchmarks.bench_request_response
+import io
+import timeit
+import tracemalloc
+
+from webob import Request as WebObRequest
+from webob import Response as WebObResponse
+
+from seraphim import Request, Response
+
+NUMBER = 20_000
+QUICK = {"number": 2_000}
+
+
+def _environ():
+    return {
+        "REQUEST_METHOD": "GET",
+        "SCRIPT_NAME": "",
+        "PATH_INFO": "/books/42",
+        "QUERY_STRING": "page=2",
+        "SERVER_NAME": "testserver",
+        "SERVER_PORT": "80",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "HTTP_HOST": "testserver",
+        "HTTP_ACCEPT": "application/json",
+        "wsgi.url_scheme": "http",
+        "wsgi.input": io.BytesIO(),
+    }
+
+
+def _start_response(status, headers, exc_info=None):
+    pass
+
+
+def webob_cycle():
+    environ = _environ()
+    request = WebObRequest(environ)
+    request.path, request.method
+    response = WebObResponse(body=b"Hello, books", content_type="text/plain", status=200)
+    return b"".join(response(environ, _start_response))
+
+
+def native_cycle():
+    environ = _environ()
+    request = Request(environ)
+    request.path, request.method
+    response = Response()
+    response.text = "Hello, books"
+    return b"".join(response(environ, _start_response))
+
+
+def _peak_bytes(func, number=1_000):
+    # peak traced memory while running `number` cycles back to back
+    tracemalloc.start()
+    for _ in range(number):
+        func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def run(number=NUMBER):
+    results = {}
+    for name, func in (("webob", webob_cycle), ("native", native_cycle)):
+        assert func() == b"Hello, books"
+        seconds = min(timeit.repeat(func, number=number, repeat=5))
+        results[name] = {
+            "us_per_request": seconds / number * 1e6,
+            "requests_per_sec": number / seconds,
+            "peak_bytes": _peak_bytes(func),
+        }
+    return results
+
+
+def main():
+    results = run()
+    for name, result in results.items():
+        print(
+            f"{name:>8}: {result['us_per_request']:8.2f} us/request "
+            f"{result['requests_per_sec']:>12,.0f} req/s "
+            f"peak {result['peak_bytes']:>8,} B"
+        )
+    speedup = results["webob"]["us_per_request"] / results["native"]["us_per_request"]
+    print(f"native is {speedup:.2f}x faster")
+
+
+if __name__ == "__main__":
+    main()
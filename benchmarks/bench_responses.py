@@ -0,0 +1,65 @@
+# Requests/sec through API.__call__ per response type.
+# Run with: python -m benchmarks.bench_responses
+import os
+
+from seraphim import API
+
+from .common import call, per_second
+
+NUMBER = 10_000
+QUICK = {"number": 1_000}
+EXAMPLE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "example")
+BOOKS = [
+    {"id": index, "title": f"Book {index}", "published": index % 2 == 0} for index in range(100)
+]
+
+
+def _api():
+    api = API(
+        templates_dir=os.path.join(EXAMPLE_DIR, "templates"),
+        static_dir=os.path.join(EXAMPLE_DIR, "static"),
+        templates_auto_reload=False,
+    )
+
+    @api.route("/text")
+    def text(req, resp):
+        resp.text = "Hello, books"
+
+    @api.route("/json")
+    def json(req, resp):
+        resp.json = BOOKS
+
+    @api.route("/json-stream")
+    def json_stream(req, resp):
+        resp.json_stream = iter(BOOKS)
+
+    @api.route("/html")
+    def html(req, resp):
+        resp.html = "<html><body><h1>Books</h1></body></html>"
+
+    @api.route("/template")
+    def template(req, resp):
+        resp.html = api.template("index.html", context={"title": "Books", "name": "Seraphim"})
+
+    return api
+
+
+def run(number=NUMBER):
+    api = _api()
+    cases = ("/text", "/json", "/json-stream", "/html", "/template", "/static/main.css")
+    results = {}
+    for path in cases:
+        assert call(api, path), path
+        results[path.strip("/")] = {
+            "requests_per_sec": per_second(lambda path=path: call(api, path), number)
+        }
+    return results
+
+
+def main():
+    for name, result in run().items():
+        print(f"{name:>16}: {result['requests_per_sec']:>12,.0f} req/s")
+
+
+if __name__ == "__main__":
+    main()
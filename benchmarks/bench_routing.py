@@ -0,0 +1,50 @@
+# Requests/sec through API.__call__ depending on the number of registered routes.
+# Run with: python -m benchmarks.bench_routing
+from seraphim import API
+
+from .common import call, per_second
+
+NUMBER = 20_000
+ROUTE_COUNTS = (10, 100, 1000)
+QUICK = {"number": 2_000}
+
+
+def _handler(req, resp, **kwargs):
+    resp.text = "ok"
+
+
+def _api(routes):
+    api = API()
+    for index in range(routes // 2):
+        api.add_route(f"/pages{index}/about", _handler)
+        api.add_route(f"/items{index}/{{id:d}}", _handler)
+    return api
+
+
+def run(number=NUMBER, route_counts=ROUTE_COUNTS):
+    results = {}
+    for routes in route_counts:
+        api = _api(routes)
+        last = routes // 2 - 1
+        cases = {
+            "first_static": "/pages0/about",
+            "last_static": f"/pages{last}/about",
+            "last_param": f"/items{last}/42",
+            "not_found": "/missing/page",
+        }
+        results[routes] = {
+            name: {"requests_per_sec": per_second(lambda path=path: call(api, path), number)}
+            for name, path in cases.items()
+        }
+    return results
+
+
+def main():
+    print(f"{'routes':>6} {'case':>14} {'req/s':>12}")
+    for routes, cases in run().items():
+        for name, result in cases.items():
+            print(f"{routes:>6} {name:>14} {result['requests_per_sec']:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
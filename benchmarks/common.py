@@ -0,0 +1,40 @@
+# Helpers shared by the benchmark modules
+import io
+import timeit
+
+REPEAT = 5
+
+
+def environ(path, method="GET", query_string="", **extra):
+    return {
+        "REQUEST_METHOD": method,
+        "SCRIPT_NAME": "",
+        "PATH_INFO": path,
+        "QUERY_STRING": query_string,
+        "SERVER_NAME": "testserver",
+        "SERVER_PORT": "80",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "HTTP_HOST": "testserver",
+        "wsgi.url_scheme": "http",
+        "wsgi.input": io.BytesIO(),
+        **extra,
+    }
+
+
+def start_response(status, headers, exc_info=None):
+    pass
+
+
+def call(app, path, **kwargs):
+    # one full WSGI cycle, including reading (and closing) the body
+    body = app(environ(path, **kwargs), start_response)
+    try:
+        return b"".join(body)
+    finally:
+        if hasattr(body, "close"):
+            body.close()
+
+
+def per_second(func, number, repeat=REPEAT):
+    # best of `repeat` runs => the least disturbed measurement
+    return number / min(timeit.repeat(func, number=number, repeat=repeat))
@@ -0,0 +1,67 @@
+# Diffs two runs of benchmarks.run, exits with 1 when a metric regressed more than --threshold %.
+# Run with: python -m benchmarks.compare baseline.json current.json [--threshold 10]
+import argparse
+import json
+import sys
+
+# metric name -> is a bigger value better?
+HIGHER_IS_BETTER = ("per_sec",)
+
+
+def flatten(results, prefix=""):
+    metrics = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            metrics.update(flatten(value, name))
+        elif isinstance(value, (int, float)):
+            metrics[name] = value
+    return metrics
+
+
+def higher_is_better(name):
+    metric = name.rsplit(".", 1)[-1]
+    return any(marker in metric for marker in HIGHER_IS_BETTER)
+
+
+def compare(baseline, current, threshold=10.0):
+    # -> [(metric, baseline, current, change %, regressed)] for metrics present in both runs
+    old = flatten(baseline["benchmarks"])
+    new = flatten(current["benchmarks"])
+    rows = []
+    for name in sorted(old.keys() & new.keys()):
+        if not old[name]:
+            continue
+        change = (new[name] - old[name]) / abs(old[name]) * 100
+        worse = -change if higher_is_better(name) else change
+        rows.append((name, old[name], new[name], change, worse > threshold))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed regression in %%")
+    args = parser.parse_args()
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    with open(args.current) as file:
+        current = json.load(file)
+
+    rows = compare(baseline, current, args.threshold)
+    width = max((len(name) for name, *_ in rows), default=6)
+    print(f"{'metric':<{width}} {'baseline':>14} {'current':>14} {'change':>9}")
+    for name, old, new, change, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:<{width}} {old:>14,.3f} {new:>14,.3f} {change:>+8.1f}%{flag}")
+
+    regressions = sum(regressed for *_, regressed in rows)
+    if regressions:
+        print(f"{regressions} metric(s) regressed by more than {args.threshold}%")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
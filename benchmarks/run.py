@@ -0,0 +1,71 @@
+# Runs the benchmark suite and writes the results as JSON (input of benchmarks.compare).
+# Run with: python -m benchmarks.run [--quick] [--output results.json] [benchmark ...]
+import argparse
+import datetime
+import importlib
+import json
+import platform
+import sys
+import time
+
+import seraphim
+
+BENCHMARKS = (
+    "bench_routing",
+    "bench_middleware",
+    "bench_responses",
+    "bench_request_response",
+    "bench_orm",
+    "bench_orm_fk_loading",
+    "bench_orm_memory",
+)
+
+
+def run(names=BENCHMARKS, quick=False):
+    report = {
+        "meta": {
+            "date": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seraphim": seraphim.__version__,
+            "quick": quick,
+        },
+        "benchmarks": {},
+        "skipped": {},
+    }
+    for name in names:
+        try:
+            module = importlib.import_module(f"benchmarks.{name}")
+        except ImportError as e:  # e.g. WebOb isn't installed
+            report["skipped"][name] = str(e)
+            print(f"{name}: skipped ({e})", file=sys.stderr)
+            continue
+        start = time.perf_counter()
+        results = module.run(**(module.QUICK if quick else {}))
+        print(f"{name}: {time.perf_counter() - start:.1f} s", file=sys.stderr)
+        # JSON round trip => int keys (routes, rows...) become strings like after loading
+        report["benchmarks"][name] = json.loads(json.dumps(results))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("benchmarks", nargs="*", help=f"any of {', '.join(BENCHMARKS)}")
+    parser.add_argument("--quick", action="store_true", help="smaller sizes, for smoke runs")
+    parser.add_argument("--output", help="JSON file, stdout by default")
+    args = parser.parse_args()
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    report = run(args.benchmarks or BENCHMARKS, quick=args.quick)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
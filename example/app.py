@@ -103,3 +103,8 @@ class SimpleCustomMiddleware(Middleware):
 
 
 app.add_middleware(SimpleCustomMiddleware)
+
+
+###################################
+# ASGI entry point -> e.g. uvicorn example.app:asgi_app
+asgi_app = app.asgi
@@ -1,10 +1,16 @@
 from .api import API as API
 from .middleware import Middleware as Middleware
+from .cache import CacheMiddleware as CacheMiddleware
+from .compression import GZipMiddleware as GZipMiddleware
+from .request import Request as Request
 from .response import Response as Response
 from .orm import Database as Database
 from .orm import Table as Table
 from .orm import Column as Column
 from .orm import ForeignKey as ForeignKey
+from .orm import Index as Index
+from .orm import QueryCountMiddleware as QueryCountMiddleware
+from .async_orm import AsyncDatabase as AsyncDatabase
 
 
 __version__ = "0.1.1"
@@ -1,43 +1,134 @@
+import asyncio
+import functools
 import inspect
 import os
 
-from jinja2 import Environment, FileSystemLoader
-from parse import parse
-from webob import Request  # ,Response
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
 from requests import Session as RequestsSession  # TODO: do we need aliases?
-from whitenoise import WhiteNoise
 from wsgiadapter import WSGIAdapter as RequestsWSGIAdapter
 
+from .asgi import (
+    ASGITestClient,
+    build_environ,
+    handle_lifespan,
+    read_body,
+    reject_websocket,
+    send_wsgi_response,
+)
+from .encoders import get_json_encoder
+from .instrumentation import Instrumentation, timed, timed_async, timer
 from .middleware import Middleware
+from .request import Request
 from .response import Response
+from .router import Router
+from .static import StaticFiles, is_hashed_file
 
 ALLOWED_METHODS = ["get", "post", "put", "patch", "delete", "options"]
 
 
 class API:
-    def __init__(self, templates_dir=None, static_dir=None):
+    def __init__(
+        self,
+        templates_dir=None,
+        static_dir=None,
+        static_url="/static",
+        static_max_age=60,
+        static_immutable_file_test=is_hashed_file,
+        json_backend="json",
+        templates_cache_size=400,
+        templates_auto_reload=True,
+        templates_bytecode_cache_dir=None,
+        debug=False,
+        instrumentation=False,
+        profile_threshold=None,
+        profile_dir="profiles",
+        profile_sample_rate=1.0,
+    ):
         self.routes = {}
+        self.router = Router()
         self.exception_handler = None
         self.middleware = Middleware(self)
+        self.pipeline = None
+        self.json_encoder = get_json_encoder(json_backend)
+
+        # per-phase timers, route histograms and slow request profiles; off => no extra work
+        # per request, the timed hooks are only wrapped in when it's on
+        self.debug = debug
+        self.instrumentation = None
+        if debug or instrumentation or profile_threshold is not None:
+            self.instrumentation = Instrumentation(
+                debug=debug,
+                profile_threshold=profile_threshold,
+                profile_dir=profile_dir,
+                profile_sample_rate=profile_sample_rate,
+            )
+            self.find_handler = timed(self.find_handler, "route")
 
         # TODO: fix, handle default dirs
+        self.templates_env = None
         if templates_dir is not None:
+            # production setup -> templates_auto_reload=False skips the per-render mtime checks,
+            # the bytecode cache lets cold workers skip compiling templates
+            bytecode_cache = None
+            if templates_bytecode_cache_dir is not None:
+                os.makedirs(templates_bytecode_cache_dir, exist_ok=True)
+                bytecode_cache = FileSystemBytecodeCache(templates_bytecode_cache_dir)
             self.templates_env = Environment(
-                loader=FileSystemLoader(os.path.abspath(templates_dir))
+                loader=FileSystemLoader(os.path.abspath(templates_dir)),
+                cache_size=templates_cache_size,
+                auto_reload=templates_auto_reload,
+                bytecode_cache=bytecode_cache,
             )
+        # static files are served before (and never reach) the middlewares and handlers
+        self.static = None
         if static_dir is not None:
-            self.whitenoise = WhiteNoise(self.wsgi_app, root=static_dir)
+            self.static = StaticFiles(
+                static_dir,
+                url=static_url,
+                max_age=static_max_age,
+                immutable_file_test=static_immutable_file_test,
+            )
 
     def __call__(self, environ, start_response):
         # return self.wsgi_app(environ, start_response)
-        # return self.whitenoise(environ, start_response)
         # return self.middleware(environ, start_response)
 
-        path_info = environ["PATH_INFO"]
-        if path_info.startswith("/static"):
-            environ["PATH_INFO"] = path_info[len("/static") :]
-            return self.whitenoise(environ, start_response)
-        return self.middleware(environ, start_response)
+        if self.static is not None:
+            static_file = self.static.find(environ["PATH_INFO"])
+            if static_file is not None:
+                return self.static.serve(static_file, environ, start_response)
+
+        request = Request(environ)
+        if self.instrumentation is not None:
+            response = self.run_instrumented(request)
+        else:
+            response = self.run_pipeline(request)
+        return response(environ, start_response)
+
+    async def asgi(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await handle_lifespan(receive, send)
+            return
+        if scope["type"] == "websocket":
+            await reject_websocket(receive, send)
+            return
+        if scope["type"] != "http":
+            raise NotImplementedError(f"Unsupported ASGI scope type: {scope['type']}")
+
+        environ = build_environ(scope, await read_body(receive))
+        if self.static is not None:
+            static_file = self.static.find(environ["PATH_INFO"])
+            if static_file is not None:
+                serve = functools.partial(self.static.serve, static_file)
+                await send_wsgi_response(serve, environ, send, in_thread=True)
+                return
+
+        request = Request(environ)
+        if self.instrumentation is not None:
+            response = await self.run_instrumented_async(request)
+        else:
+            response = await self.run_pipeline_async(request)
+        await send_wsgi_response(response, environ, send)
 
     def wsgi_app(self, environ, start_response):
         request = Request(environ)
@@ -47,71 +138,257 @@ class API:
     def template(self, template_name, context=None):
         if context is None:
             context = {}
-        return self.templates_env.get_template(template_name).render(**context)
+        with timer("template"):
+            return self.templates_env.get_template(template_name).render(**context)
+
+    async def template_async(self, template_name, context=None):
+        # rendering is CPU bound -> keep it off the event loop
+        return await asyncio.to_thread(self.template, template_name, context)
+
+    def precompile_templates(self, extensions=None):
+        # warm up the template cache at startup, instead of on the first request per template
+        names = self.templates_env.list_templates(extensions=extensions)
+        for name in names:
+            self.templates_env.get_template(name)
+        return names
+
+    def compress_static(self, skip_extensions=None, use_brotli=True):
+        # writes the .gz/.br siblings of the static files and picks them up right away
+        return self.static.compress(skip_extensions, use_brotli)
 
     def add_exception_handler(self, exception_handler):
         self.exception_handler = exception_handler
 
-    def add_middleware(self, middleware_cls):
-        self.middleware.add(middleware_cls)
+    def add_middleware(self, middleware_cls, **options):
+        return self.middleware.add(middleware_cls, **options)
 
-    def add_route(self, path, handler, allowed_methods=None):
+    def build_pipeline(self):
+        # flatten the nested middleware chain (outermost first) into pre-bound hooks,
+        # leaving out hooks that aren't overridden => no frames spent on no-ops
+        chain = []
+        node = self.middleware.app
+        while node is not self:
+            chain.append(node)
+            node = node.app
+
+        request_hooks = []
+        response_hooks = []
+        for index, middleware in enumerate(chain):
+            middleware_cls = type(middleware)
+            name = middleware_cls.__name__
+            if (
+                middleware_cls.handle_request is not Middleware.handle_request
+                or middleware_cls.handle_request_async is not Middleware.handle_request_async
+            ):
+                # custom request handling can't be flattened -> keep the nested chain
+                return self.middleware.app, None, None
+            if middleware_cls.process_request is not Middleware.process_request:
+                hook = middleware.process_request
+                if self.instrumentation is not None:
+                    hook = timed(hook, f"{name}.request")
+                request_hooks.append((index, hook))
+            if middleware_cls.process_response is not Middleware.process_response:
+                hook = middleware.process_response
+                if self.instrumentation is not None:
+                    hook = timed(hook, f"{name}.response")
+                response_hooks.append((index, hook))
+        response_hooks.reverse()
+        return self.middleware.app, request_hooks, response_hooks
+
+    def get_pipeline(self):
+        # rebuilt lazily whenever a middleware was added since the last request
+        if self.pipeline is None or self.pipeline[0] is not self.middleware.app:
+            self.pipeline = self.build_pipeline()
+        return self.pipeline
+
+    def run_pipeline(self, request):
+        _, request_hooks, response_hooks = self.get_pipeline()
+        if request_hooks is None:
+            return self.middleware.handle_request(request)
+
+        for index, hook in request_hooks:
+            response = hook(request)
+            if response is not None:
+                # short-circuit -> only middlewares that already saw the request see the response
+                self.run_response_hooks(response_hooks, request, response, index)
+                return response
+
+        response = self.handle_request(request)
+        for _, hook in response_hooks:
+            hook(request, response)
+        return response
+
+    async def run_pipeline_async(self, request):
+        _, request_hooks, response_hooks = self.get_pipeline()
+        if request_hooks is None:
+            return await self.middleware.handle_request_async(request)
+
+        for index, hook in request_hooks:
+            response = hook(request)
+            if response is not None:
+                self.run_response_hooks(response_hooks, request, response, index)
+                return response
+
+        response = await self.handle_request_async(request)
+        for _, hook in response_hooks:
+            hook(request, response)
+        return response
+
+    def run_instrumented(self, request):
+        state = self.instrumentation.start()
+        response = None
+        try:
+            response = self.run_pipeline(request)
+            # rendered here (instead of in response.__call__) to be part of the timings
+            with timer("render"):
+                response.set_body_and_content_type()
+        finally:
+            self.instrumentation.finish(state, request, response)
+        return response
+
+    async def run_instrumented_async(self, request):
+        state = self.instrumentation.start()
+        response = None
+        try:
+            response = await self.run_pipeline_async(request)
+            with timer("render"):
+                response.set_body_and_content_type()
+        finally:
+            self.instrumentation.finish(state, request, response)
+        return response
+
+    @staticmethod
+    def run_response_hooks(response_hooks, request, response, last_index):
+        for index, hook in response_hooks:
+            if index <= last_index:
+                hook(request, response)
+
+    def add_route(self, path, handler, allowed_methods=None, singleton=False, cache=None):
         assert path not in self.routes, "Such route already exists."
-        # if allowed_methods is None:
-        #     allowed_methods = ALLOWED_METHODS
+        if not allowed_methods:
+            allowed_methods = ALLOWED_METHODS
+        allowed_methods = [method.lower() for method in allowed_methods]
+
+        # resolve method -> callable once, so requests don't pay for reflection
+        methods = {}
+        async_methods = set()
+        if inspect.isclass(handler):
+            instance = handler() if singleton else None
+            for method in ALLOWED_METHODS:
+                func = getattr(handler, method, None)
+                if func is None or method not in allowed_methods:
+                    continue
+                if instance is not None:
+                    methods[method] = getattr(instance, method)
+                else:
+                    methods[method] = self._instance_per_request(handler, func)
+                if inspect.iscoroutinefunction(func):
+                    async_methods.add(method)
+        else:
+            for method in allowed_methods:
+                methods[method] = handler
+                if inspect.iscoroutinefunction(handler):
+                    async_methods.add(method)
+
+        if self.instrumentation is not None:
+            methods = {
+                method: (timed_async if method in async_methods else timed)(func, "handler")
+                for method, func in methods.items()
+            }
+
         self.routes[path] = {
+            "path": path,
             "handler": handler,
-            "allowed_methods": allowed_methods if allowed_methods else ALLOWED_METHODS,
+            "allowed_methods": frozenset(methods),
+            "allow_header": ", ".join(method.upper() for method in methods),
+            "methods": methods,
+            "async_methods": frozenset(async_methods),
+            "cache": cache,  # TTL in seconds, used by CacheMiddleware
         }
+        self.router.add(path, self.routes[path])
 
-    def route(self, path, allowed_methods=None):
+    def route(self, path, allowed_methods=None, singleton=False, cache=None):
         def wrapper(handler):
-            self.add_route(path, handler, allowed_methods)
+            self.add_route(path, handler, allowed_methods, singleton, cache)
             return handler
 
         return wrapper
 
+    @staticmethod
+    def _instance_per_request(handler_cls, func):
+        def handler(request, response, **kwargs):
+            return func(handler_cls(), request, response, **kwargs)
+
+        return handler
+
     def handle_request(self, request):
-        response = Response()
-        handler_data, kwargs = self.find_handler(request_path=request.path)
+        response = self.create_response()
+        handler, kwargs, is_async = self.resolve_handler(request, response)
+        if handler is None:
+            return response
         try:
-            if handler_data is not None:
-                handler = handler_data["handler"]
-                allowed_methods = handler_data["allowed_methods"]
-                # if isinstance(handler, type):
-                if inspect.isclass(handler):
-                    # TODO: do we need to call handler?
-                    handler = getattr(handler(), request.method.lower(), None)
-                    if handler is None:
-                        raise AttributeError(
-                            f"Method not allowed: {request.method}"
-                        )  # TODO: should we return 500?
-                elif request.method.lower() not in allowed_methods:
-                    raise AttributeError("Method not allowed", request.method)
-                handler(request, response, **kwargs)
-            else:
-                self.default_response(response)
+            result = handler(request, response, **kwargs)
+            if is_async:
+                # async handler served through WSGI
+                asyncio.run(result)
         except Exception as e:  # TODO: change exception type
             if self.exception_handler is None:
-                raise e
+                raise
+            self.exception_handler(request, response, e)
+        return response
+
+    async def handle_request_async(self, request):
+        response = self.create_response()
+        handler, kwargs, is_async = self.resolve_handler(request, response)
+        if handler is None:
+            return response
+        try:
+            if is_async:
+                await handler(request, response, **kwargs)
             else:
-                self.exception_handler(request, response, e)
+                # sync handlers must not block the event loop
+                await asyncio.to_thread(handler, request, response, **kwargs)
+        except Exception as e:
+            if self.exception_handler is None:
+                raise
+            self.exception_handler(request, response, e)
         return response
 
+    def resolve_handler(self, request, response):
+        # -> (handler, kwargs, is_async), handler is None once response is a 404 / 405
+        handler_data, kwargs = self.find_handler(request_path=request.path)
+        request.route = handler_data
+        if handler_data is None:
+            self.default_response(response)
+            return None, None, False
+        method = request.method.lower()
+        if method not in handler_data["allowed_methods"]:
+            self.method_not_allowed_response(response, handler_data)
+            return None, None, False
+        return handler_data["methods"][method], kwargs, method in handler_data["async_methods"]
+
+    def create_response(self):
+        return Response(json_encoder=self.json_encoder, templates_env=self.templates_env)
+
     def find_handler(self, request_path):
-        for path, handler_data in self.routes.items():
-            parse_result = parse(path, request_path)
-            if parse_result is not None:
-                return handler_data, parse_result.named
-        return None, None
+        return self.router.match(request_path)
 
     @staticmethod
     def default_response(response):
         response.status_code = 404
         response.text = "Not found."
 
+    @staticmethod
+    def method_not_allowed_response(response, handler_data):
+        response.status_code = 405
+        response.text = "Method not allowed."
+        response.headers["Allow"] = handler_data["allow_header"]
+
     ###################
     def test_session(self, base_url="http://testserver"):
         session = RequestsSession()
         session.mount(prefix=base_url, adapter=RequestsWSGIAdapter(self))
         return session
+
+    def asgi_test_client(self, base_url="http://testserver"):
+        return ASGITestClient(self.asgi, base_url=base_url)
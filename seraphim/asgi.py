@@ -0,0 +1,257 @@
+import asyncio
+import io
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing
+from json import dumps as json_dumps
+from json import loads as json_loads
+from urllib.parse import urlencode, urlsplit
+from wsgiref.util import FileWrapper
+
+from requests.structures import CaseInsensitiveDict
+
+from .response import FILE_CHUNK_SIZE
+
+_END_OF_STREAM = object()
+STREAM_IDLE_THREADS = 8  # stream threads kept for reuse, more run while there are more streams
+
+_stream_executors = []  # idle single-thread executors
+_stream_executors_lock = threading.Lock()
+
+
+async def read_body(receive):
+    chunks = []
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunks.append(message.get("body", b""))
+        more_body = message.get("more_body", False)
+    return b"".join(chunks)
+
+
+def build_environ(scope, body):
+    server_name, server_port = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf8").decode("latin1"),
+        "PATH_INFO": scope["path"].encode("utf8").decode("latin1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin1"),
+        "SERVER_NAME": server_name,
+        "SERVER_PORT": str(server_port),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+        "wsgi.file_wrapper": _file_wrapper,
+        "asgi.scope": scope,
+    }
+    if scope.get("client"):
+        environ["REMOTE_ADDR"] = scope["client"][0]
+
+    for raw_name, raw_value in scope.get("headers", []):
+        name = raw_name.decode("latin1").upper().replace("-", "_")
+        value = raw_value.decode("latin1")
+        if name == "CONTENT_LENGTH" or name == "CONTENT_TYPE":
+            environ[name] = value
+            continue
+        key = f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    if "CONTENT_LENGTH" not in environ and body:
+        environ["CONTENT_LENGTH"] = str(len(body))
+    return environ
+
+
+async def send_wsgi_response(wsgi_app, environ, send, in_thread=False):
+    # seraphim responses (and WhiteNoise) are WSGI callables -> capture what they emit
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"] = int(status.split(" ", 1)[0])
+        started["headers"] = [
+            (name.lower().encode("latin1"), value.encode("latin1")) for name, value in headers
+        ]
+
+    if in_thread:
+        # blocking (file) IO -> keep it off the event loop, the body is streamed like any other
+        body = await asyncio.to_thread(wsgi_app, environ, start_response)
+    else:
+        body = wsgi_app(environ, start_response)
+    await send(
+        {
+            "type": "http.response.start",
+            "status": started["status"],
+            "headers": started["headers"],
+        }
+    )
+    if isinstance(body, list):
+        for chunk in body:
+            if chunk:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+    else:
+        async with aclosing(_iterate_in_thread(body)) as chunks:
+            async for chunk in chunks:
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+    await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def _checkout_stream_executor():
+    with _stream_executors_lock:
+        if _stream_executors:
+            return _stream_executors.pop()
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="seraphim-stream")
+
+
+def _release_stream_executor(executor):
+    with _stream_executors_lock:
+        if len(_stream_executors) < STREAM_IDLE_THREADS:
+            _stream_executors.append(executor)
+            return
+    executor.shutdown(wait=False)
+
+
+def _file_wrapper(file, block_size=FILE_CHUNK_SIZE):
+    # bigger blocks than wsgiref's 8 KiB default -> fewer thread hops per file
+    return FileWrapper(file, block_size)
+
+
+async def _iterate_in_thread(body):
+    # streamed bodies (generators, files) may block -> advance them off the event loop.
+    # A single thread per stream keeps thread-bound resources (e.g. sqlite cursors) usable,
+    # threads are reused by later streams => no new thread (and thread-local connection) each time
+    loop = asyncio.get_running_loop()
+    executor = _checkout_stream_executor()
+    iterator = iter(body)
+    try:
+        while True:
+            chunk = await loop.run_in_executor(executor, next, iterator, _END_OF_STREAM)
+            if chunk is _END_OF_STREAM:
+                break
+            yield chunk
+    finally:
+        try:
+            if hasattr(body, "close"):
+                await loop.run_in_executor(executor, body.close)
+        finally:
+            _release_stream_executor(executor)
+
+
+async def handle_lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def reject_websocket(receive, send):
+    # no websocket support -> close during the handshake, the server answers 403
+    message = await receive()
+    if message["type"] == "websocket.connect":
+        await send({"type": "websocket.close", "code": 1000})
+
+
+#########################################
+class ASGITestResponse:
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8")
+
+    def json(self):
+        return json_loads(self.content)
+
+
+class ASGITestClient:
+    # runs requests in-process against an ASGI app, without a server
+    def __init__(self, app, base_url="http://testserver"):
+        self.app = app
+        self.base_url = base_url
+
+    def request(self, method, url, **kwargs):
+        return asyncio.run(self.request_async(method, url, **kwargs))
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.request("PATCH", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+    async def request_async(self, method, url, params=None, headers=None, data=None, json=None):
+        parts = urlsplit(url if "://" in url else self.base_url + url)
+        query_string = parts.query
+        if params:
+            query_string = "&".join(filter(None, [query_string, urlencode(params)]))
+
+        headers = dict(headers or {})
+        if json is not None:
+            data = json_dumps(json)
+            headers.setdefault("Content-Type", "application/json")
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        body = data or b""
+        headers.setdefault("Host", parts.netloc)
+        if body:
+            headers.setdefault("Content-Length", str(len(body)))
+
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method.upper(),
+            "scheme": parts.scheme,
+            "path": parts.path or "/",
+            "raw_path": (parts.path or "/").encode("utf-8"),
+            "query_string": query_string.encode("latin1"),
+            "root_path": "",
+            "headers": [
+                (name.lower().encode("latin1"), str(value).encode("latin1"))
+                for name, value in headers.items()
+            ],
+            "client": ("testclient", 50000),
+            "server": (parts.hostname or "testserver", parts.port or 80),
+        }
+
+        request_sent = False
+        response = {"headers": CaseInsensitiveDict(), "body": []}
+
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            # nothing else to send -> block like a connection that stays open
+            await asyncio.Event().wait()
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                for name, value in message.get("headers", []):
+                    response["headers"][name.decode("latin1")] = value.decode("latin1")
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+
+        await self.app(scope, receive, send)
+        return ASGITestResponse(response["status"], response["headers"], b"".join(response["body"]))
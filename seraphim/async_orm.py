@@ -0,0 +1,162 @@
+import asyncio
+import contextvars
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing
+
+from .asgi import _iterate_in_thread
+from .orm import ITER_CHUNK_SIZE, Database, QueryObject
+
+_END_OF_ITERATION = object()
+
+
+class AsyncDatabase:
+    # Database for async handlers: every call runs on a dedicated pool of worker threads,
+    # each using a pooled sqlite connection => queries never block the event loop.
+    # At most max_workers calls run at once, the rest wait (see metrics)
+    def __init__(self, path, max_workers=4, **options):
+        self.db = Database(path, pool_size=max_workers, **options)
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="seraphim-db")
+        self._semaphore = asyncio.Semaphore(max_workers)
+        self._metrics = {
+            "calls": 0,
+            "running": 0,
+            "waiting": 0,
+            "max_waiting": 0,
+            "wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+        }
+
+    @property
+    def metrics(self):
+        metrics = dict(self._metrics)
+        calls = metrics["calls"]
+        metrics["avg_wait_seconds"] = metrics["wait_seconds"] / calls if calls else 0.0
+        return metrics
+
+    async def _acquire(self):
+        metrics = self._metrics
+        metrics["waiting"] += 1
+        metrics["max_waiting"] = max(metrics["max_waiting"], metrics["waiting"])
+        start = time.perf_counter()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            metrics["waiting"] -= 1
+        waited = time.perf_counter() - start
+        metrics["calls"] += 1
+        metrics["running"] += 1
+        metrics["wait_seconds"] += waited
+        metrics["max_wait_seconds"] = max(metrics["max_wait_seconds"], waited)
+
+    def _release(self):
+        self._metrics["running"] -= 1
+        self._semaphore.release()
+
+    async def run(self, func, *args, **kwargs):
+        # func(*args, **kwargs) on a worker, holding one connection for the whole call
+        # -> e.g. run(lambda db: ...) for transactions spanning several statements
+        await self._acquire()
+        try:
+            loop = asyncio.get_running_loop()
+            # copied context => db.session() of the calling task applies on the worker as well
+            call = functools.partial(self._run_sync, func, *args, **kwargs)
+            return await loop.run_in_executor(self._executor, contextvars.copy_context().run, call)
+        finally:
+            self._release()
+
+    def _run_sync(self, func, *args, **kwargs):
+        with self.db.connection():
+            return func(*args, **kwargs)
+
+    async def tables(self):
+        return await self.run(lambda: self.db.tables)
+
+    async def create(self, table):
+        return await self.run(self.db.create, table)
+
+    async def save(self, instance):
+        return await self.run(self.db.save, instance)
+
+    async def bulk_save(self, instances, **kwargs):
+        return await self.run(self.db.bulk_save, instances, **kwargs)
+
+    async def bulk_update(self, instances, **kwargs):
+        return await self.run(self.db.bulk_update, instances, **kwargs)
+
+    async def bulk_delete(self, table, ids, **kwargs):
+        return await self.run(self.db.bulk_delete, table, ids, **kwargs)
+
+    async def get_all(self, table, **kwargs):
+        return await self.run(self.db.get_all, table, **kwargs)
+
+    async def get_by_id(self, table, id, **kwargs):
+        return await self.run(self.db.get_by_id, table, id, **kwargs)
+
+    async def filter(self, table, **kwargs):
+        return await self.run(self.db.filter, table, **kwargs)
+
+    async def update(self, instance):
+        return await self.run(self.db.update, instance)
+
+    async def delete(self, table, id):
+        return await self.run(self.db.delete, table, id)
+
+    async def explain(self, query, params=()):
+        return await self.run(self.db.explain, query, params)
+
+    async def iter_all(self, table, **kwargs):
+        async for item in self._iterate(self.db.iter_all(table, **kwargs)):
+            yield item
+
+    async def _iterate(self, iterator):
+        # the cursor lives on one connection -> one dedicated thread drives the whole iteration,
+        # every step in a copy of the caller's context like run()
+        iterator = _run_in_context(contextvars.copy_context(), iterator)
+        await self._acquire()
+        try:
+            async with aclosing(_iterate_in_thread(iterator)) as items:
+                async for item in items:
+                    yield item
+        finally:
+            self._release()
+
+    def get(self, table):
+        return AsyncQueryObject(self, table)
+
+    def session(self):
+        return self.db.session()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.db.close()
+
+
+def _run_in_context(context, iterator):
+    try:
+        while (item := context.run(next, iterator, _END_OF_ITERATION)) is not _END_OF_ITERATION:
+            yield item
+    finally:
+        context.run(iterator.close)
+
+
+class AsyncQueryObject(QueryObject):
+    # same builder methods, awaitable results
+    def __init__(self, async_db, table):
+        super().__init__(async_db.db, table)
+        self.async_db = async_db
+
+    async def execute(self):
+        return await self.async_db.run(super().execute)
+
+    async def count(self):
+        return await self.async_db.run(super().count)
+
+    async def exists(self):
+        return await self.async_db.run(super().exists)
+
+    async def iterate(self, chunk_size=ITER_CHUNK_SIZE):
+        async for item in self.async_db._iterate(super().iterate(chunk_size)):
+            yield item
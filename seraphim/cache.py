@@ -0,0 +1,137 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from .compression import add_vary
+from .middleware import Middleware
+from .response import Response, find_header, get_header
+
+CACHEABLE_METHODS = ("GET", "HEAD")
+UNCACHEABLE_DIRECTIVES = ("no-store", "private")
+
+
+class LRUCache:
+    # thread-safe LRU store where every entry carries its own expiry time
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.entries.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class CacheMiddleware(Middleware):
+    # caches full responses of routes registered with route(..., cache=<ttl seconds>)
+    def __init__(self, app, max_entries=1024, vary=("Accept", "Accept-Encoding")):
+        super().__init__(app)
+        self.store = LRUCache(max_entries)
+        self.vary = tuple(vary)
+        self.hits = 0
+        self.misses = 0
+
+    def process_request(self, req):
+        if req.method not in CACHEABLE_METHODS:
+            return None
+        entry = self.store.get(self.cache_key(req))
+        if entry is None:
+            return None
+        self.hits += 1
+        return self.build_response(entry)
+
+    def process_response(self, req, resp):
+        if req.method not in CACHEABLE_METHODS:
+            return
+        if req.route is not None:  # served by a handler, not from the cache
+            self.store_response(self.cache_key(req), req, resp)
+        self.set_not_modified(req, resp)
+
+    def cache_key(self, request):
+        headers = request.headers
+        return (
+            request.method,
+            request.path,
+            request.query_string,
+            tuple(headers.get(name) for name in self.vary),
+        )
+
+    def store_response(self, key, request, response):
+        ttl = request.route["cache"]
+        if not ttl or response.status_code != 200:
+            return
+
+        self.misses += 1
+        response.set_body_and_content_type()
+        if response.stream is not None or response.file is not None:
+            return  # streamed bodies are never buffered
+        if not self.is_shareable(response):
+            return
+
+        headers = response.headers
+        if find_header(headers, "ETag") is None:
+            headers["ETag"] = self.etag(response.body)
+        for field in self.vary:
+            # merged => a Vary set earlier (e.g. by GZipMiddleware) keeps its fields and gets ours
+            add_vary(headers, field)
+        entry = (response.content_type, dict(response.headers), response.body)
+        self.store.set(key, entry, ttl)
+
+    @staticmethod
+    def is_shareable(response):
+        # cached entries are replayed to every client -> nothing user specific
+        headers = response.headers
+        if find_header(headers, "Set-Cookie") is not None:
+            return False
+        directives = get_header(headers, "Cache-Control", "").lower()
+        return not any(directive in directives for directive in UNCACHEABLE_DIRECTIVES)
+
+    @staticmethod
+    def build_response(entry):
+        content_type, headers, body = entry
+        response = Response()
+        response.content_type = content_type
+        response.headers = dict(headers)
+        response.body = body
+        return response
+
+    @staticmethod
+    def etag(body):
+        return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+    @staticmethod
+    def set_not_modified(request, response):
+        etag = get_header(response.headers, "ETag")
+        if_none_match = request.headers.get("If-None-Match")
+        if etag is None or if_none_match is None:
+            return
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if "*" in tags or etag in tags:
+            response.status_code = 304
+            response.body = b""
+
+    def clear(self):
+        self.store.clear()
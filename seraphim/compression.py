@@ -0,0 +1,222 @@
+import functools
+import zlib
+
+from .middleware import Middleware
+from .response import find_header, get_header
+
+MINIMUM_SIZE = 500  # bytes, smaller bodies don't win enough to be worth the CPU (and the header)
+COMPRESSION_LEVELS = {"br": 4, "zstd": 3, "gzip": 6}  # tuned for on the fly, not for max ratio
+# already compressed formats -> compressing them again only burns CPU
+EXCLUDED_CONTENT_TYPES = (
+    "image/",
+    "video/",
+    "audio/",
+    "font/woff",
+    "application/zip",
+    "application/gzip",
+    "application/x-gzip",
+    "application/x-bzip2",
+    "application/x-xz",
+    "application/x-7z-compressed",
+    "application/x-rar-compressed",
+    "application/zstd",
+    "application/pdf",
+    "application/octet-stream",
+)
+COMPRESSIBLE_IMAGE_TYPES = ("image/svg+xml",)
+
+
+class _GzipCompressor:
+    __slots__ = ("compressor",)
+
+    def __init__(self, level):
+        # wbits 16 + 15 -> gzip container
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+class _BrotliCompressor:
+    __slots__ = ("compressor",)
+
+    def __init__(self, level):
+        import brotli
+
+        self.compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self.compressor.process(data)
+
+    def flush(self):
+        return self.compressor.flush()
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+class _ZstdCompressor:
+    __slots__ = ("compressor", "flush_block")
+
+    def __init__(self, level):
+        import zstandard
+
+        self.compressor = zstandard.ZstdCompressor(level=level).compressobj()
+        self.flush_block = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush(self.flush_block)
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+# in server preference order, used to break ties between equally accepted encodings
+ENCODINGS = {
+    "br": _BrotliCompressor,
+    "zstd": _ZstdCompressor,
+    "gzip": _GzipCompressor,
+}
+
+
+def get_encodings(encodings=None):
+    # None -> every installed encoding (gzip is always there), names -> exactly those
+    # (raises ImportError at startup if the package of one of them is missing)
+    if encodings is None:
+        available = []
+        for name, compressor_cls in ENCODINGS.items():
+            try:
+                compressor_cls(1)
+            except ImportError:
+                continue
+            available.append(name)
+        return tuple(available)
+    for name in encodings:
+        if name not in ENCODINGS:
+            raise ValueError(f"Unknown encoding: {name}")
+        ENCODINGS[name](1)
+    return tuple(encodings)
+
+
+@functools.lru_cache(maxsize=256)
+def negotiate_encoding(accept_encoding, encodings):
+    # highest q-value wins, ties go to the order of encodings. Browsers send only a handful
+    # of distinct headers => parsed once per header value
+    qualities = {}
+    for part in accept_encoding.lower().split(","):
+        coding, *params = part.split(";")
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        coding = coding.strip()
+        qualities["gzip" if coding == "x-gzip" else coding] = quality
+
+    default = qualities.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for name in encodings:
+        quality = qualities.get(name, default)
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+class GZipMiddleware(Middleware):
+    # compresses responses with the best encoding the client accepts (gzip, plus br/zstd when
+    # brotli/zstandard are installed). Bodies under minimum_size and already compressed content
+    # types are sent as they are, streams are compressed chunk by chunk while they're sent.
+    # Add it before CacheMiddleware => responses are cached compressed (per Accept-Encoding)
+    def __init__(
+        self,
+        app,
+        minimum_size=MINIMUM_SIZE,
+        encodings=None,
+        levels=None,
+        excluded_content_types=EXCLUDED_CONTENT_TYPES,
+    ):
+        super().__init__(app)
+        self.minimum_size = minimum_size
+        self.encodings = get_encodings(encodings)
+        self.levels = {**COMPRESSION_LEVELS, **(levels or {})}
+        self.excluded_content_types = tuple(excluded_content_types)
+
+    def process_response(self, req, resp):
+        resp.set_body_and_content_type()
+        if not self.should_compress(resp):
+            return
+
+        # the representation depends on Accept-Encoding from here on, whatever this client sent
+        add_vary(resp.headers, "Accept-Encoding")
+        encoding = negotiate_encoding(req.headers.get("Accept-Encoding", ""), self.encodings)
+        if encoding is None:
+            return
+
+        compressor = ENCODINGS[encoding](self.levels[encoding])
+        if resp.stream is not None:
+            resp.stream = compress_stream(resp.stream, compressor)
+        else:
+            resp.body = compressor.compress(resp.body) + compressor.finish()
+        headers = resp.headers
+        headers["Content-Encoding"] = encoding
+        headers.pop(find_header(headers, "Content-Length"), None)  # recomputed by Response
+        etag_key = find_header(headers, "ETag")
+        if etag_key is not None and not headers[etag_key].startswith("W/"):
+            # a strong ETag identifies the exact bytes, which have just changed
+            headers[etag_key] = f"W/{headers[etag_key]}"
+
+    def should_compress(self, response):
+        # files are left alone -> they're served with ranges / sendfile(),
+        # precompress static assets instead (API.compress_static)
+        if response.file is not None or response.status_code < 200:
+            return False
+        if response.status_code in (204, 206, 304):
+            return False
+        if response.stream is None and len(response.body) < self.minimum_size:
+            return False
+        headers = response.headers
+        if find_header(headers, "Content-Encoding") is not None:
+            return False
+        if "no-transform" in get_header(headers, "Cache-Control", "").lower():
+            return False
+        content_type = (response.content_type or "").lower()
+        return content_type in COMPRESSIBLE_IMAGE_TYPES or not content_type.startswith(
+            self.excluded_content_types
+        )
+
+
+def compress_stream(stream, compressor):
+    # every chunk is flushed as it comes => clients still get the body progressively
+    try:
+        for chunk in stream:
+            data = compressor.compress(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+    finally:
+        close = getattr(stream, "close", None)
+        if close is not None:
+            close()
+
+
+def add_vary(headers, name):
+    key = find_header(headers, "Vary")
+    vary = headers[key] if key is not None else ""
+    if not vary:
+        headers[key or "Vary"] = name
+    elif vary.strip() != "*" and name.lower() not in (
+        field.strip().lower() for field in vary.split(",")
+    ):
+        headers[key] = f"{vary}, {name}"
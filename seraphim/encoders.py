@@ -0,0 +1,66 @@
+import json
+
+JSON_STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _stdlib_encoder():
+    return json.dumps
+
+
+def _orjson_encoder():
+    import orjson
+
+    return orjson.dumps
+
+
+def _ujson_encoder():
+    import ujson
+
+    return ujson.dumps
+
+
+JSON_BACKENDS = {
+    "json": _stdlib_encoder,
+    "orjson": _orjson_encoder,
+    "ujson": _ujson_encoder,
+}
+
+
+def get_json_encoder(backend="json"):
+    # backend -> "json" | "orjson" | "ujson" | "auto" (fastest installed) | callable(obj) -> str/bytes
+    if callable(backend):
+        return backend
+    if backend == "auto":
+        for name in ("orjson", "ujson"):
+            try:
+                return JSON_BACKENDS[name]()
+            except ImportError:
+                continue
+        return _stdlib_encoder()
+    if backend not in JSON_BACKENDS:
+        raise ValueError(f"Unknown JSON backend: {backend}")
+    return JSON_BACKENDS[backend]()  # raises ImportError at startup if the package is missing
+
+
+def encode_json(encoder, obj):
+    data = encoder(obj)
+    return data.encode("UTF-8") if isinstance(data, str) else data
+
+
+def iter_json_array(items, encoder, chunk_size=JSON_STREAM_CHUNK_SIZE):
+    # items are encoded one by one and flushed in ~chunk_size pieces -> memory stays flat
+    buffer = [b"["]
+    size = 1
+    separator = b""
+    for item in items:
+        data = encode_json(encoder, item)
+        buffer.append(separator)
+        buffer.append(data)
+        size += len(data) + len(separator)
+        separator = b","
+        if size >= chunk_size:
+            yield b"".join(buffer)
+            buffer = []
+            size = 0
+    buffer.append(b"]")
+    yield b"".join(buffer)
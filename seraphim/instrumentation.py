@@ -0,0 +1,202 @@
+import cProfile
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Timings of the request being handled, None when instrumentation is off
+_timings = ContextVar("seraphim_timings", default=None)
+
+UNMATCHED_ROUTE = "<unmatched>"
+MIDDLEWARE_ROUTE = "<middleware>"  # answered by a middleware before routing (e.g. a cache hit)
+
+
+class Timings:
+    # per-request phase durations in seconds, repeated phases (e.g. templates) add up
+    __slots__ = ("phases",)
+
+    def __init__(self):
+        self.phases = {}
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def server_timing(self):
+        return ", ".join(
+            f"{name};dur={seconds * 1000:.3f}" for name, seconds in self.phases.items()
+        )
+
+
+@contextmanager
+def timer(name):
+    # records into the current request's Timings, a no-op outside of instrumented requests
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
+
+
+def record(name, seconds):
+    # for durations measured elsewhere (e.g. ORM queries)
+    timings = _timings.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+def timed(func, name):
+    # wraps once at setup time => no cost in the request path while instrumentation is off
+    def wrapper(*args, **kwargs):
+        with timer(name):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def timed_async(func, name):
+    async def wrapper(*args, **kwargs):
+        with timer(name):
+            return await func(*args, **kwargs)
+
+    return wrapper
+
+
+class Histogram:
+    # keeps the last max_samples observations -> percentiles reflect recent traffic
+    def __init__(self, max_samples=1024):
+        self.samples = deque(maxlen=max_samples)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def percentile(self, percent):
+        return _percentile(sorted(self.samples), percent)
+
+    def summary(self):
+        ordered = sorted(self.samples)
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": _percentile(ordered, 50),
+            "p95": _percentile(ordered, 95),
+            "p99": _percentile(ordered, 99),
+            "max": ordered[-1] if ordered else 0.0,
+        }
+
+
+def _percentile(ordered, percent):
+    # nearest-rank on sorted samples
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, round(percent / 100 * (len(ordered) - 1)))]
+
+
+class MetricsRegistry:
+    # request durations per route pattern ('/books/{id}', not '/books/1' => bounded cardinality)
+    def __init__(self, max_samples=1024):
+        self.max_samples = max_samples
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def observe(self, route, seconds):
+        with self.lock:
+            histogram = self.histograms.get(route)
+            if histogram is None:
+                histogram = self.histograms[route] = Histogram(self.max_samples)
+            histogram.observe(seconds)
+
+    def summary(self):
+        with self.lock:
+            return {route: histogram.summary() for route, histogram in self.histograms.items()}
+
+    def clear(self):
+        with self.lock:
+            self.histograms.clear()
+
+
+class Profiler:
+    # profiles a sample of the requests, keeps the ones slower than threshold (seconds)
+    # as .prof files (snakeviz, pstats...). One request is profiled at a time
+    def __init__(self, threshold, directory="profiles", sample_rate=1.0):
+        self.threshold = threshold
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.lock = threading.Lock()
+
+    def start(self):
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return None
+        if not self.lock.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def stop(self, profile, seconds, request, route):
+        profile.disable()
+        self.lock.release()
+        if seconds < self.threshold:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        name = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+        path = os.path.join(
+            self.directory,
+            f"{time.time_ns()}-{request.method}-{name}-{seconds * 1000:.0f}ms.prof",
+        )
+        profile.dump_stats(path)
+        return path
+
+
+class Instrumentation:
+    # debug=True adds a Server-Timing header to every response
+    def __init__(
+        self,
+        debug=False,
+        max_samples=1024,
+        profile_threshold=None,
+        profile_dir="profiles",
+        profile_sample_rate=1.0,
+    ):
+        self.debug = debug
+        self.registry = MetricsRegistry(max_samples)
+        self.profiler = None
+        if profile_threshold is not None:
+            self.profiler = Profiler(profile_threshold, profile_dir, profile_sample_rate)
+
+    def start(self):
+        timings = Timings()
+        token = _timings.set(timings)
+        profile = self.profiler.start() if self.profiler is not None else None
+        return timings, token, profile, time.perf_counter()
+
+    def finish(self, state, request, response):
+        timings, token, profile, start = state
+        seconds = time.perf_counter() - start
+        _timings.reset(token)
+        route = self.route_name(request, response)
+        if profile is not None:
+            self.profiler.stop(profile, seconds, request, route)
+        self.registry.observe(route, seconds)
+        if self.debug and response is not None:
+            timings.add("total", seconds)
+            response.headers["Server-Timing"] = timings.server_timing()
+
+    @staticmethod
+    def route_name(request, response):
+        if request.route is not None:
+            return request.route["path"]
+        if response is not None and response.status_code == 404:
+            return UNMATCHED_ROUTE
+        return MIDDLEWARE_ROUTE
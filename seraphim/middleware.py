@@ -1,4 +1,4 @@
-from webob.request import Request
+from .request import Request
 
 
 class Middleware:
@@ -10,9 +10,11 @@ class Middleware:
         response = self.app.handle_request(request)
         return response(environ, start_response)
 
-    def add(self, middleware_cls):
-        self.app = middleware_cls(self.app)
+    def add(self, middleware_cls, **options):
+        self.app = middleware_cls(self.app, **options)
+        return self.app
 
+    # return a Response to short-circuit -> the handler and the inner middlewares are skipped
     def process_request(self, req):
         pass
 
@@ -20,7 +22,15 @@ class Middleware:
         pass
 
     def handle_request(self, request):
-        self.process_request(request)
-        response = self.app.handle_request(request)
+        response = self.process_request(request)
+        if response is None:
+            response = self.app.handle_request(request)
+        self.process_response(request, response)
+        return response
+
+    async def handle_request_async(self, request):
+        response = self.process_request(request)
+        if response is None:
+            response = await self.app.handle_request_async(request)
         self.process_response(request, response)
         return response
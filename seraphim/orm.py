@@ -1,6 +1,41 @@
-import inspect
+import functools
+import logging
+import queue
 import sqlite3
+import threading
+import time
+import weakref
+from collections import namedtuple
+from contextlib import contextmanager
+from contextvars import ContextVar
 
+from . import instrumentation
+from .cache import LRUCache
+from .middleware import Middleware
+
+logger = logging.getLogger("seraphim.orm")
+
+
+MAX_SQL_PARAMS = 900  # stay below SQLITE_MAX_VARIABLE_NUMBER of older sqlite builds
+BULK_BATCH_SIZE = 1000
+LOOKUP_OPERATORS = {
+    "exact": "=",
+    "ne": "!=",
+    "gt": ">",
+    "gte": ">=",
+    "lt": "<",
+    "lte": "<=",
+    "like": "LIKE",
+}
+ITER_CHUNK_SIZE = 1000
+
+# QueryStats of the current request / track_queries() block
+_query_stats = ContextVar("seraphim_query_stats", default=None)
+
+# (rows by (sql, params), recording) while a QueryObject.cache(ttl) result is loaded, see _load_cached
+_cached_rows = ContextVar("seraphim_cached_rows", default=None)
+
+QueryRecord = namedtuple("QueryRecord", ("sql", "params", "seconds", "rows"))
 
 SQLITE_TYPE_MAP = {
     int: "INTEGER",
@@ -12,13 +47,311 @@ SQLITE_TYPE_MAP = {
 
 
 class Database:
-    def __init__(self, path):
-        self.conn = sqlite3.Connection(path)
+    def __init__(
+        self,
+        path,
+        pool_size=None,
+        pool_timeout=10.0,
+        busy_timeout=5000,
+        journal_mode="WAL",
+        synchronous="NORMAL",
+        pragmas=None,
+        cached_statements=128,
+        sql_cache_size=512,
+        query_cache_size=1024,
+        slow_query_threshold=None,
+    ):
+        # pool_size=None -> one connection per thread, otherwise a bounded pool shared by all threads
+        self.path = path
+        self.in_memory = path == ":memory:"
+        if self.in_memory:
+            pool_size = 1  # every connection to ':memory:' would be a separate database
+        self.pool_size = pool_size
+        self.pool_timeout = pool_timeout
+        self.pragmas = {"busy_timeout": busy_timeout}
+        if not self.in_memory:
+            self.pragmas["journal_mode"] = journal_mode
+            self.pragmas["synchronous"] = synchronous
+        self.pragmas.update(pragmas or {})
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = set()
+        self._pool = queue.LifoQueue() if pool_size else None
+        self._pool_created = 0
+
+        # cached_statements -> prepared statements kept by every sqlite3 connection
+        self.cached_statements = cached_statements
+        # QueryObject shape -> compiled sql
+        self._compile_query = functools.lru_cache(maxsize=sql_cache_size)(_compile_query)
+        # results of QueryObject.cache(ttl) + per table write counters, see _load_cached
+        self._query_cache = LRUCache(query_cache_size)
+        self._table_versions = {}
+        # identity map of the current db.session() -> {(table, id): instance}, weakly referenced
+        self._session = ContextVar(f"seraphim_session_{id(self)}", default=None)
+        # queries taking at least this many seconds are logged as warnings on 'seraphim.orm'
+        self.slow_query_threshold = slow_query_threshold
+        self.query_listeners = []  # callables receiving every QueryRecord
+
+    @property
+    def conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            return conn
+        if self.in_memory:
+            # a single connection anyway => usable outside 'db.connection()' too
+            with self.connection() as conn:
+                return conn
+        if self._pool is not None:
+            raise RuntimeError("Pooled connections are only available inside 'db.connection()'")
+        conn = self._local.conn = self._connect()
+        # the thread-local storage is dropped when its thread exits -> so is the connection
+        self._local.thread_exit = _ThreadExit()
+        weakref.finalize(
+            self._local.thread_exit, _close_connection, conn, self._connections, self._lock
+        )
+        return conn
+
+    @contextmanager
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None or self._pool is None:
+            # re-entrant => nested calls share the connection (and its transaction)
+            yield conn if conn is not None else self.conn
+            return
+
+        conn = self._checkout()
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            # (the ':memory:' connection is also shared through db.conn -> left as it is)
+            if conn.in_transaction and not self.in_memory:
+                conn.rollback()
+            self._pool.put(conn)
+
+    def _connect(self):
+        # connections never run on two threads at once, but pooled ones move between threads
+        # and close() may be called from any thread
+        conn = sqlite3.connect(
+            self.path, check_same_thread=False, cached_statements=self.cached_statements
+        )
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        with self._lock:
+            self._connections.add(conn)
+        return conn
+
+    def _checkout(self):
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_connect = self._pool_created < self.pool_size
+            if can_connect:
+                self._pool_created += 1
+        if can_connect:
+            return self._connect()
+        try:
+            return self._pool.get(timeout=self.pool_timeout)
+        except queue.Empty:
+            raise TimeoutError(
+                f"No database connection available after {self.pool_timeout} seconds"
+            ) from None
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+        if self._pool is not None:
+            self._pool = queue.LifoQueue()
+            self._pool_created = 0
+
+    def _execute(self, sql, params=(), fetch=None, commit=False, many=False):
+        # every statement of the ORM runs through here (transaction control aside)
+        # fetch -> "all" | "one" | None (cursor); rows are read before a pooled connection is released
+        start = time.perf_counter()
+        with self.connection() as conn:
+            cursor = conn.executemany(sql, params) if many else conn.execute(sql, params)
+            if fetch == "all":
+                result = cursor.fetchall()
+                rows = len(result)
+            elif fetch == "one":
+                result = cursor.fetchone()
+                rows = int(result is not None)
+            else:
+                result = cursor
+                rows = cursor.rowcount if cursor.rowcount >= 0 else None
+            if commit and not self._transaction_depth:
+                conn.commit()
+        # executemany -> params of every row (the callers pass lists, nothing is consumed twice)
+        count = sum(map(len, params)) if many else len(params)
+        self._record(QueryRecord(sql, count, time.perf_counter() - start, rows))
+        return result
+
+    def _record(self, query):
+        stats = _query_stats.get()
+        if stats is not None:
+            stats.add(self, query)
+        instrumentation.record("db", query.seconds)
+        if self.slow_query_threshold is not None and query.seconds >= self.slow_query_threshold:
+            logger.warning(
+                "Slow query (%.1f ms, %d params, %s rows): %s",
+                query.seconds * 1000,
+                query.params,
+                query.rows,
+                query.sql,
+            )
+        elif logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Query (%.1f ms): %s", query.seconds * 1000, query.sql)
+        for listener in self.query_listeners:
+            listener(query)
+
+    @contextmanager
+    def assert_num_queries(self, count):
+        # test helper -> fails if the block runs a different number of queries on this db
+        with track_queries(self) as stats:
+            yield stats
+        if stats.count != count:
+            queries = "\n".join(f"  {query.sql}" for query in stats.queries)
+            raise AssertionError(f"Expected {count} queries, got {stats.count}:\n{queries}")
+
+    @property
+    def _transaction_depth(self):
+        return getattr(self._local, "transaction_depth", 0)
+
+    @contextmanager
+    def transaction(self):
+        # one commit for everything inside the block; nested blocks become savepoints
+        # => an inner failure only rolls back its own changes
+        with self.connection() as conn:
+            depth = self._transaction_depth
+            savepoint = f"seraphim_{depth}"
+            if depth:
+                conn.execute(f"SAVEPOINT {savepoint}")
+            else:
+                if not conn.in_transaction:
+                    conn.execute("BEGIN")
+                self._local.written_tables = set()
+            self._local.transaction_depth = depth + 1
+            try:
+                yield conn
+            except BaseException:
+                if depth:
+                    conn.execute(f"ROLLBACK TO SAVEPOINT {savepoint}")
+                    conn.execute(f"RELEASE SAVEPOINT {savepoint}")
+                else:
+                    conn.rollback()
+                raise
+            else:
+                if depth:
+                    conn.execute(f"RELEASE SAVEPOINT {savepoint}")
+                else:
+                    conn.commit()
+            finally:
+                self._local.transaction_depth = depth
+                if not depth:
+                    # other connections only see the changes now -> invalidate once more
+                    for table in self._local.written_tables:
+                        self._invalidate(table)
+
+    @contextmanager
+    def session(self):
+        # within a session every row is hydrated once: loads, FK prefetches and get_by_id calls
+        # return the same instance for the same (table, id). Works as a decorator too,
+        # e.g. around a handler => one identity map per request. Nested sessions share the map
+        if self._session.get() is not None:
+            yield self._session.get()
+            return
+        token = self._session.set(weakref.WeakValueDictionary())
+        try:
+            yield self._session.get()
+        finally:
+            self._session.reset(token)
+
+    def _get_loaded(self):
+        # identity map for a load: the session's, or a fresh one for just this load
+        identity_map = self._session.get()
+        return {} if identity_map is None else identity_map
+
+    @staticmethod
+    def _get_mapped(loaded, table, id):
+        # instances loaded with .only() miss attributes => never reused as full ones,
+        # reloading them fills in what's missing
+        instance = loaded.get((table, id))
+        if instance is not None and table._schema.attributes <= instance._data.keys():
+            return instance
+        return None
+
+    def _identify(self, instance):
+        # saved/updated instance -> the one the session hands out for its (table, id)
+        identity_map = self._session.get()
+        if identity_map is None:
+            return
+        key = (type(instance), instance.id)
+        mapped = identity_map.get(key)
+        if mapped is None:
+            identity_map[key] = instance
+        elif mapped is not instance:
+            mapped._data.update(instance._data)
+
+    def _forget(self, table, ids):
+        identity_map = self._session.get()
+        if identity_map is not None:
+            for id in ids:
+                identity_map.pop((table, id), None)
+
+    def _invalidate(self, table):
+        # every write bumps the table's version => cached results built from it can't hit anymore
+        with self._lock:
+            self._table_versions[table] = self._table_versions.get(table, 0) + 1
+        if self._transaction_depth:
+            self._local.written_tables.add(table)
+
+    def _load_cached(self, ttl, table, sql, params, fields, related, prefetch_related, lazy, raw):
+        # the rows of every query of the load (FK prefetches included) are cached, not the
+        # instances => hits run no query but build fresh instances (or the session's ones)
+        if self._transaction_depth:
+            # uncommitted data must not leak into the shared cache
+            return self._load(table, sql, params, fields, related, prefetch_related, lazy, raw)
+        versions = tuple(self._table_versions.get(t, 0) for t in table._schema.dependencies)
+        key = (sql, tuple(params), tuple(prefetch_related), lazy, raw, versions)
+        rows = self._query_cache.get(key)
+        recording = rows is None
+        if recording:
+            rows = {}
+        token = _cached_rows.set((rows, recording))
+        try:
+            result = self._load(table, sql, params, fields, related, prefetch_related, lazy, raw)
+        finally:
+            _cached_rows.reset(token)
+        if recording:
+            self._query_cache.set(key, rows, ttl)
+        return result
+
+    def _fetch_all(self, sql, params):
+        cached_rows = _cached_rows.get()
+        if cached_rows is None:
+            return self._execute(sql, params, fetch="all")
+        rows, recording = cached_rows
+        key = (sql, tuple(params))
+        if not recording:
+            result = rows.get(key)
+            if result is not None:
+                return result
+        result = self._execute(sql, params, fetch="all")
+        if recording:
+            rows[key] = result
+        return result
 
     @property
     def tables(self):
         SELECT_TABLES_SQL = "SELECT name FROM sqlite_master WHERE type = 'table'"
-        return [x[0] for x in self.conn.execute(SELECT_TABLES_SQL).fetchall()]  # FIXME
+        return [x[0] for x in self._execute(SELECT_TABLES_SQL, fetch="all")]  # FIXME
 
     def create(self, table):
         # TODO: refactor with cursor.close()
@@ -28,77 +361,378 @@ class Database:
         #     self.conn.commit()
         # finally:
         #     cursor.close()
-        self.conn.execute(table._get_create_sql())
+        self._execute(table._get_create_sql())
+        for sql in table._get_create_indexes_sql():
+            self._execute(sql)
+
+    def explain(self, query, params=()):
+        # sqlite's plan for a QueryObject (or raw sql) -> e.g. ['SEARCH book USING INDEX ...']
+        if isinstance(query, QueryObject):
+            query, params, _, _ = query._get_sql()
+        rows = self._execute(f"EXPLAIN QUERY PLAN {query}", params, fetch="all")
+        return [row[3] for row in rows]
 
     def save(self, instance):
         sql, values = instance._get_insert_sql()
-        cursor = self.conn.execute(sql, values)
+        cursor = self._execute(sql, values, commit=True)
         instance._data["id"] = cursor.lastrowid
-        self.conn.commit()
+        self._invalidate(type(instance))
+        self._identify(instance)
 
-    def get_all(self, table):
-        sql, fields = table._get_select_all_sql()
-        result = []
-        for row in self.conn.execute(sql).fetchall():
-            instance = table()
-            for field, value in zip(fields, row):
-                if field.endswith("_id"):
-                    field = field[:-3]
-                    fk = getattr(table, field)
-                    value = self.get_by_id(fk.table, id=value)
-                setattr(instance, field, value)
-            result.append(instance)
-        return result
+    def bulk_save(self, instances, batch_size=BULK_BATCH_SIZE):
+        # executemany per batch, all batches in one transaction (=> one commit).
+        # Ids are contiguous within a batch: AUTOINCREMENT + the write lock held by the transaction
+        with self.transaction():
+            for table, batch in _batches(instances, batch_size):
+                sql, _ = batch[0]._get_insert_sql()
+                self._execute(sql, [instance._get_values() for instance in batch], many=True)
+                self._invalidate(table)
+                last_id = self._execute("SELECT last_insert_rowid()", fetch="one")[0]
+                for id, instance in enumerate(batch, start=last_id - len(batch) + 1):
+                    instance._data["id"] = id
+                    self._identify(instance)
+
+    def bulk_update(self, instances, batch_size=BULK_BATCH_SIZE):
+        with self.transaction():
+            for table, batch in _batches(instances, batch_size):
+                sql, _ = batch[0]._get_update_sql()
+                params = [[*instance._get_values(), instance.id] for instance in batch]
+                self._execute(sql, params, many=True)
+                self._invalidate(table)
+                for instance in batch:
+                    self._identify(instance)
+
+    def bulk_delete(self, table, ids, batch_size=BULK_BATCH_SIZE):
+        sql, _ = table._get_delete_sql(None)
+        ids = list(ids)
+        with self.transaction():
+            for start in range(0, len(ids), batch_size):
+                self._execute(sql, [(id,) for id in ids[start : start + batch_size]], many=True)
+            self._invalidate(table)
+        self._forget(table, ids)
+
+    # FK loading strategies:
+    #   select_related   -> FK rows are fetched in the same query with a LEFT JOIN
+    #   prefetch_related -> one 'WHERE id IN (...)' query per FK table
+    #   lazy             -> every other FK becomes a ForeignKeyProxy, loaded on attribute access
+    # FKs that aren't joined are prefetched unless lazy=True => no more one query per row
+    # raw=True -> read-only namedtuple rows (Table._schema.row_class) with the FK ids, no FK loading
+    def get_all(self, table, select_related=(), prefetch_related=(), lazy=False, raw=False):
+        if select_related and not raw:
+            sql, fields, related, params = table._get_select_related_sql(select_related)
+        else:
+            (sql, fields), related, params = table._get_select_all_sql(), (), []
+        return self._load(table, sql, params, fields, related, prefetch_related, lazy, raw)
+
+    def get_by_id(self, table, id, select_related=(), prefetch_related=(), lazy=False):
+        identity_map = self._session.get()
+        if identity_map is not None:
+            instance = self._get_mapped(identity_map, table, id)
+            if instance is not None:
+                return instance
+        if select_related:
+            sql, fields, related, params = table._get_select_related_sql(select_related, id=id)
+        else:
+            (sql, fields, params), related = table._get_select_where_sql(id=id), ()
+        result = self._load(table, sql, params, fields, related, prefetch_related, lazy)
+        return result[0] if result else None
 
-    def get_by_id(self, table, id):
-        sql, fields, params = table._get_select_where_sql(id=id)
-        row = self.conn.execute(sql, params).fetchone()
-        if row is None:
-            return row
-
-        instance = table()
-        for field, value in zip(fields, row):
-            if field.endswith("_id"):
-                field = field[:-3]
-                fk = getattr(table, field)
-                value = self.get_by_id(fk.table, id=value)
-            setattr(instance, field, value)
-        return instance
-
-    def filter(self, table, **kwargs):
-        sql, fields, params = table._get_select_where_sql(**kwargs)
-        rows = self.conn.execute(sql, params).fetchall()
-        if len(rows) == 0:
-            return rows
+    def filter(
+        self, table, select_related=(), prefetch_related=(), lazy=False, raw=False, **kwargs
+    ):
+        if select_related and not raw:
+            sql, fields, related, params = table._get_select_related_sql(select_related, **kwargs)
+        else:
+            (sql, fields, params), related = table._get_select_where_sql(**kwargs), ()
+        return self._load(table, sql, params, fields, related, prefetch_related, lazy, raw)
 
+    def iter_all(
+        self,
+        table,
+        chunk_size=ITER_CHUNK_SIZE,
+        select_related=(),
+        prefetch_related=(),
+        lazy=False,
+        raw=False,
+    ):
+        if select_related and not raw:
+            sql, fields, related, params = table._get_select_related_sql(select_related)
+        else:
+            (sql, fields), related, params = table._get_select_all_sql(), (), []
+        return self._iter_load(
+            table, sql, params, fields, related, prefetch_related, lazy, chunk_size, raw
+        )
+
+    def _load(
+        self, table, sql, params, fields, related=(), prefetch_related=(), lazy=False, raw=False
+    ):
+        with self.connection():
+            rows = self._fetch_all(sql, params)
+            if raw:
+                return list(map(table._schema.get_row_class(fields)._make, rows))
+            loaded = self._get_loaded()
+            return self._hydrate(table, fields, rows, loaded, related, prefetch_related, lazy)
+
+    def _iter_load(
+        self,
+        table,
+        sql,
+        params,
+        fields,
+        related=(),
+        prefetch_related=(),
+        lazy=False,
+        chunk_size=ITER_CHUNK_SIZE,
+        raw=False,
+    ):
+        # rows are fetched and hydrated chunk_size at a time => memory doesn't grow with the table.
+        # The connection (and the open cursor) is held until the generator is exhausted or closed
+        with self.connection():
+            cursor = self._execute(sql, params)
+            try:
+                while rows := cursor.fetchmany(chunk_size):
+                    if raw:
+                        yield from map(table._schema.get_row_class(fields)._make, rows)
+                        continue
+                    # new identity map per chunk (unless in a session, whose map is weak anyway)
+                    # -> FK rows are prefetched per chunk, never all kept
+                    loaded = self._get_loaded()
+                    yield from self._hydrate(
+                        table, fields, rows, loaded, related, prefetch_related, lazy
+                    )
+            finally:
+                cursor.close()
+
+    def _hydrate(self, table, fields, rows, loaded, related=(), prefetch_related=(), lazy=False):
+        # loaded -> {(table, id): instance} shared by the whole load, so every row is built once
+        # (and FK cycles terminate); related -> [(fk name, joined fields)] from select_related
+        joined = {name for name, _ in related}
+        # FKs left out by .only() aren't loaded
+        foreign_keys = [
+            (name, fk)
+            for name, fk in table._schema.foreign_keys
+            if name not in joined and f"{name}_id" in fields
+        ]
+        fk_columns = table._schema.fk_columns
+        base_length = len(fields)
+        joined_rows = {}
+        pending = {}
         result = []
         for row in rows:
-            instance = table()
-            for field, value in zip(fields, row):
-                if field.endswith("_id"):
-                    field = field[:-3]
-                    fk = getattr(table, field)
-                    value = self.get_by_id(fk.table, id=value)
-                setattr(instance, field, value)
+            data = dict(zip(fields, row[:base_length]))
+            instance = loaded.get((table, data["id"]))
+            if instance is None:
+                instance = table(**{f: v for f, v in data.items() if f not in fk_columns})
+                loaded[(table, data["id"])] = instance
+            elif loaded is self._session.get():
+                # instance from earlier in the session -> keep its state, only add missing columns
+                for field, value in data.items():
+                    if field not in fk_columns:
+                        instance._data.setdefault(field, value)
+
+            offset = base_length
+            for name, related_fields in related:
+                related_row = row[offset : offset + len(related_fields)]
+                offset += len(related_fields)
+                if related_row[0] is None:
+                    instance._data[name] = None
+                else:
+                    joined_rows.setdefault(name, []).append((instance, related_row))
+
+            for name, fk in foreign_keys:
+                fk_id = data[f"{name}_id"]
+                if fk_id is None:
+                    instance._data[name] = None
+                elif lazy and name not in prefetch_related:
+                    instance._data[name] = ForeignKeyProxy(self, fk.table, fk_id)
+                else:
+                    pending.setdefault(name, (fk, []))[1].append((instance, fk_id))
             result.append(instance)
+
+        # joined rows are built together => their own FKs are loaded in one batch per table too
+        for name, related_fields in related:
+            references = joined_rows.get(name)
+            if not references:
+                continue
+            fk_table = getattr(table, name).table
+            new_rows = {
+                related_row[0]: related_row
+                for _, related_row in references
+                if self._get_mapped(loaded, fk_table, related_row[0]) is None
+            }
+            # strong references => alive while 'loaded' is a session's weak map
+            hydrated = self._hydrate(fk_table, related_fields, new_rows.values(), loaded, lazy=lazy)
+            by_id = dict(zip(new_rows, hydrated))
+            for instance, (fk_id, *_) in references:
+                value = by_id.get(fk_id)
+                instance._data[name] = value if value is not None else loaded.get((fk_table, fk_id))
+
+        for name, (fk, references) in pending.items():
+            by_id = self._load_by_ids(fk.table, {fk_id for _, fk_id in references}, loaded, lazy)
+            for instance, fk_id in references:
+                instance._data[name] = by_id.get(fk_id)
         return result
 
+    def _load_by_ids(self, table, ids, loaded, lazy=False):
+        missing = [id for id in ids if self._get_mapped(loaded, table, id) is None]
+        instances = []  # keeps new instances alive while 'loaded' is a session's weak map
+        for start in range(0, len(missing), MAX_SQL_PARAMS):
+            sql, fields, params = table._get_select_in_sql(missing[start : start + MAX_SQL_PARAMS])
+            rows = self._fetch_all(sql, params)
+            instances.extend(self._hydrate(table, fields, rows, loaded, lazy=lazy))
+        return {id: loaded.get((table, id)) for id in ids}
+
     def update(self, instance):
         sql, values = instance._get_update_sql()
-        self.conn.execute(sql, values)
-        self.conn.commit()
+        self._execute(sql, values, commit=True)
+        self._invalidate(type(instance))
+        self._identify(instance)
 
     def delete(self, table, id):
         sql, params = table._get_delete_sql(id)
-        self.conn.execute(sql, params)
-        self.conn.commit()
+        self._execute(sql, params, commit=True)
+        self._invalidate(table)
+        self._forget(table, [id])
 
     def get(self, table):
         return QueryObject(db=self, table=table)
 
 
+class _ThreadExit:
+    # only there to be weakly referenced from a thread-local
+    __slots__ = ("__weakref__",)
+
+
+def _close_connection(conn, connections, lock):
+    with lock:
+        connections.discard(conn)
+    conn.close()
+
+
+class QueryStats:
+    # queries run while tracking; db=None -> queries of every Database.
+    # Every query is reported to the enclosing stats as well => nested tracking doesn't hide any
+    def __init__(self, db=None, parent=None):
+        self.db = db
+        self.parent = parent
+        self.count = 0
+        self.seconds = 0.0
+        self.queries = []
+        self.token = None  # set while the stats of a request are the current ones
+
+    def add(self, db, query):
+        if self.db is None or self.db is db:
+            self.count += 1
+            self.seconds += query.seconds
+            self.queries.append(query)
+        if self.parent is not None:
+            self.parent.add(db, query)
+
+
+@contextmanager
+def track_queries(db=None):
+    stats = QueryStats(db, parent=_query_stats.get())
+    token = _query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _query_stats.reset(token)
+
+
+def current_query_stats():
+    return _query_stats.get()
+
+
+class QueryCountMiddleware(Middleware):
+    # counts the ORM queries of every request -> current_query_stats() for handlers/middlewares,
+    # X-Query-Count/X-Query-Time headers on the response
+    def __init__(self, app, headers=True):
+        super().__init__(app)
+        self.headers = headers
+
+    def process_request(self, req):
+        current = _query_stats.get()
+        if current is not None and current.token is not None:
+            # left by a request that raised before process_response (sync servers reuse the
+            # thread's context)
+            _query_stats.reset(current.token)
+            current = _query_stats.get()
+        # the stats object is shared with copies of the context (e.g. handlers in asyncio.to_thread)
+        stats = QueryStats(parent=current)
+        stats.token = _query_stats.set(stats)
+
+    def process_response(self, req, resp):
+        stats = _query_stats.get()
+        if stats is None or stats.token is None:
+            return
+        _query_stats.reset(stats.token)
+        stats.token = None
+        if self.headers:
+            resp.headers["X-Query-Count"] = str(stats.count)
+            resp.headers["X-Query-Time"] = f"{stats.seconds * 1000:.3f}"
+
+
+def _compile_query(table, fields, related, shape, distinct, order, limit, offset):
+    # QueryObject shape -> sql, fields, related_fields; lru cached per Database
+    sql, fields, related_fields = table._build_select_sql(fields, related, shape, distinct)
+    if order:
+        sql += f" ORDER BY {'t0.' if related else ''}{order}"
+    if limit:
+        sql += " LIMIT ?"
+    if offset:
+        sql += " OFFSET ?"
+    return sql, fields, related_fields
+
+
+def _get_filters_shape(filters):
+    # (key, value) pairs -> what the SQL depends on: the IN list length, NULL checks
+    shape = []
+    for key, value in filters:
+        lookup = key.partition("__")[2]
+        if lookup == "in":
+            value = len(value)
+        elif lookup == "isnull":
+            value = bool(value)
+        else:
+            value = value is None
+        shape.append((key, value))
+    return tuple(shape)
+
+
+def _get_filters_params(filters):
+    params = []
+    for key, value in filters:
+        lookup = key.partition("__")[2]
+        if lookup == "in":
+            params.extend(_get_id(item) for item in value)
+        elif lookup == "isnull" or (value is None and lookup in ("", "exact", "ne")):
+            continue  # IS [NOT] NULL
+        else:
+            params.append(_get_id(value))
+    return params
+
+
+def _get_id(value):
+    # FK lookups accept instances (author=john) as well as ids (author=1)
+    return value.id if isinstance(value, (Table, ForeignKeyProxy)) else value
+
+
+def _batches(instances, batch_size):
+    # -> (table, [instances]) with at most batch_size instances of a single table each
+    by_table = {}
+    for instance in instances:
+        by_table.setdefault(type(instance), []).append(instance)
+    for table, group in by_table.items():
+        for start in range(0, len(group), batch_size):
+            yield table, group[start : start + batch_size]
+
+
 ######################################
 class Table:
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._schema = Schema(cls)
+
     def __init__(self, **kwargs):
         self._data = {
             "id": None,  # TODO: don't hardcode 'id' -> support other PK's
@@ -118,39 +752,53 @@ class Table:
 
     @classmethod
     def _get_create_sql(cls):
-        CREATE_TABLE_SQL = "CREATE TABLE IF NOT EXISTS {name} ({fields})"
-        fields = ["id INTEGER PRIMARY KEY AUTOINCREMENT"]
+        sql = cls._schema.sql.get("create")
+        if sql is None:
+            CREATE_TABLE_SQL = "CREATE TABLE IF NOT EXISTS {name} ({fields})"
+            fields = ["id INTEGER PRIMARY KEY AUTOINCREMENT"]
+            for name, field in cls._schema.members:
+                if isinstance(field, Column):
+                    fields.append(f"{name} {field.sql_type}{field.constraints}")
+                else:
+                    fields.append(f"{name}_id INTEGER")
+            sql = CREATE_TABLE_SQL.format(name=cls._schema.name, fields=", ".join(fields))
+            cls._schema.sql["create"] = sql
+        return sql
 
-        for name, field in inspect.getmembers(cls):
-            if isinstance(field, Column):
-                fields.append(f"{name} {field.sql_type}")
-            elif isinstance(field, ForeignKey):
-                fields.append(f"{name}_id INTEGER")
-        return CREATE_TABLE_SQL.format(name=cls.__name__.lower(), fields=", ".join(fields))
-
-    def _get_insert_sql(self):
-        INSERT_SQL = "INSERT INTO {name} ({fields}) VALUES ({placeholders})"
+    @classmethod
+    def _get_create_indexes_sql(cls):
+        CREATE_INDEX_SQL = "CREATE {unique}INDEX IF NOT EXISTS {index} ON {name} ({columns})"
+        return [
+            CREATE_INDEX_SQL.format(
+                unique="UNIQUE " if unique else "",
+                index=index,
+                name=cls._schema.name,
+                columns=", ".join(columns),
+            )
+            for index, columns, unique in cls._schema.indexes
+        ]
 
-        cls = self.__class__
-        fields = []
-        placeholders = []
+    def _get_values(self):
         values = []
-        for name, field in inspect.getmembers(self.__class__):
-            if isinstance(field, Column):
-                fields.append(name)
-                values.append(getattr(self, name))
-                placeholders.append("?")
-            elif isinstance(field, ForeignKey):
-                fields.append(f"{name}_id")
-                values.append(getattr(self, name).id)
-                placeholders.append("?")
-
-        sql = INSERT_SQL.format(
-            name=cls.__name__.lower(),
-            fields=", ".join(fields),
-            placeholders=", ".join(placeholders),
-        )
-        return sql, values
+        for name, field in self._schema.members:
+            value = getattr(self, name)
+            if isinstance(field, ForeignKey):
+                value = value.id if value is not None else None
+            values.append(value)
+        return values
+
+    def _get_insert_sql(self):
+        schema = self._schema
+        sql = schema.sql.get("insert")
+        if sql is None:
+            INSERT_SQL = "INSERT INTO {name} ({fields}) VALUES ({placeholders})"
+            sql = INSERT_SQL.format(
+                name=schema.name,
+                fields=", ".join(schema.fields[1:]),
+                placeholders=", ".join(["?"] * len(schema.members)),
+            )
+            schema.sql["insert"] = sql
+        return sql, self._get_values()
 
     # @classmethod
     # def _get_select_where_sql(cls, **kwargs):
@@ -176,82 +824,247 @@ class Table:
 
     @classmethod
     def _get_select_where_sql(cls, **kwargs):
-        SELECT_WHERE_SQL = "SELECT {fields} FROM {name}{where_clause}"
-        fields = ["id"]
-        for name, field in inspect.getmembers(cls):
-            if isinstance(field, Column):
-                fields.append(name)
-            elif isinstance(field, ForeignKey):
-                fields.append(f"{name}_id")
-
-        where_clause = ""
-        if kwargs:
-            where_clause = " WHERE " + " AND ".join([f"{key} = ?" for key in kwargs])
-
-        sql = SELECT_WHERE_SQL.format(
-            name=cls.__name__.lower(),
-            fields=", ".join(fields),
-            where_clause=where_clause,
-        )
-        params = list(kwargs.values())
+        sql, fields, _, params = cls._get_select_sql(filters=kwargs.items())
         return sql, fields, params
 
+    @classmethod
+    def _get_select_in_sql(cls, ids):
+        sql, fields, _ = cls._get_select_where_sql()
+        placeholders = ", ".join(["?"] * len(ids))
+        return f"{sql} WHERE id IN ({placeholders})", fields, list(ids)
+
+    @classmethod
+    def _get_select_related_sql(cls, related, **kwargs):
+        return cls._get_select_sql(related=related, filters=kwargs.items())
+
+    @classmethod
+    def _get_select_sql(cls, fields=None, related=(), filters=(), distinct=False):
+        # -> sql, fields, related_fields, params. Statements are cached per query shape
+        # (selected fields, joins, filter lookups), only the params are built per call
+        filters = list(filters)
+        shape = _get_filters_shape(filters)
+        key = ("select", fields, tuple(related), distinct, shape)
+        cached = cls._schema.sql.get(key)
+        if cached is None:
+            cached = cls._build_select_sql(fields, related, shape, distinct)
+            if not any(key.endswith("__in") for key, _ in shape):
+                # one statement per IN list length would grow the cache without bound
+                cls._schema.sql[key] = cached
+        sql, fields, related_fields = cached
+        return sql, fields, related_fields, _get_filters_params(filters)
+
+    @classmethod
+    def _build_select_sql(cls, fields, related, shape, distinct):
+        SELECT_SQL = "SELECT {distinct}{columns} FROM {name}{joins}{where_clause}"
+        JOIN_SQL = " LEFT JOIN {name} AS t{index} ON t0.{fk}_id = t{index}.id"
+
+        schema = cls._schema
+        fields = schema.fields if fields is None else list(fields)
+        prefix = "t0." if related else ""
+        columns = [f"{prefix}{field}" for field in fields]
+        joins = []
+        related_fields = []
+        for index, name in enumerate(related, start=1):
+            fk = getattr(cls, name, None)
+            if not isinstance(fk, ForeignKey):
+                raise ValueError(f"{cls.__name__}.{name} is not a ForeignKey")
+            fk_schema = fk.table._schema
+            columns.extend(f"t{index}.{field}" for field in fk_schema.fields)
+            joins.append(JOIN_SQL.format(name=fk_schema.name, index=index, fk=name))
+            related_fields.append((name, fk_schema.fields))
+
+        sql = SELECT_SQL.format(
+            distinct="DISTINCT " if distinct else "",
+            columns=", ".join(columns),
+            name=f"{schema.name} AS t0" if related else schema.name,
+            joins="".join(joins),
+            where_clause=cls._get_where_sql(shape, prefix),
+        )
+        return sql, fields, related_fields
+
+    @classmethod
+    def _get_where_sql(cls, shape, prefix=""):
+        # Django style lookups: name=, name__gt=, name__in=[...], name__isnull=True...
+        # names are checked against the schema => filter keys can't inject SQL
+        conditions = []
+        for key, arg in shape:
+            name, _, lookup = key.partition("__")
+            column = prefix + cls._schema.get_column(name)
+            lookup = lookup or "exact"
+            if lookup == "in":
+                placeholders = ", ".join(["?"] * arg)
+                conditions.append(f"{column} IN ({placeholders})" if arg else "0")
+            elif lookup == "isnull" or (arg and lookup in ("exact", "ne")):
+                is_null = arg if lookup == "isnull" else lookup == "exact"
+                conditions.append(f"{column} IS {'NULL' if is_null else 'NOT NULL'}")
+            elif lookup in LOOKUP_OPERATORS:
+                conditions.append(f"{column} {LOOKUP_OPERATORS[lookup]} ?")
+            else:
+                raise ValueError(f"Unsupported lookup '{lookup}' in '{key}'")
+        if not conditions:
+            return ""
+        return " WHERE " + " AND ".join(conditions)
+
     @classmethod
     def _get_select_all_sql(cls):
         SELECT_ALL_SQL = "SELECT * FROM {name}"
         # SELECT_ALL_SQL = "SELECT {fields} FROM {name};"
-        fields = ["id"]
-        for name, field in inspect.getmembers(cls):
-            if isinstance(field, Column):
-                fields.append(name)
-            elif isinstance(field, ForeignKey):
-                fields.append(f"{name}_id")
 
         # sql = SELECT_ALL_SQL.format(name=cls.__name__.lower(), fields=", ".join(fields))
-        sql = SELECT_ALL_SQL.format(name=cls.__name__.lower())
-        return sql, fields
+        sql = SELECT_ALL_SQL.format(name=cls._schema.name)
+        return sql, cls._schema.fields
 
     def _get_update_sql(self):
-        UPDATE_SQL = "UPDATE {name} SET {fields} WHERE id = ?"
-
-        cls = self.__class__
-        fields = []
-        values = []
-        for name, field in inspect.getmembers(cls):
-            if isinstance(field, Column):
-                fields.append(name)
-                values.append(getattr(self, name))
-            elif isinstance(field, ForeignKey):
-                fields.append(f"{name}_id")
-                values.append(getattr(self, name).id)
-        values.append(getattr(self, "id"))
-
-        sql = UPDATE_SQL.format(
-            name=cls.__name__.lower(), fields=", ".join([f"{field} = ?" for field in fields])
-        )
+        schema = self._schema
+        sql = schema.sql.get("update")
+        if sql is None:
+            UPDATE_SQL = "UPDATE {name} SET {fields} WHERE id = ?"
+            sql = UPDATE_SQL.format(
+                name=schema.name,
+                fields=", ".join([f"{field} = ?" for field in schema.fields[1:]]),
+            )
+            schema.sql["update"] = sql
+        values = self._get_values()
+        values.append(self.id)
         return sql, values
 
     @classmethod
     def _get_delete_sql(cls, id):
         DELETE_SQL = "DELETE FROM {name} WHERE id = ?"
-        sql = DELETE_SQL.format(name=cls.__name__.lower())
+        sql = DELETE_SQL.format(name=cls._schema.name)
         return sql, [id]
 
 
+class Schema:
+    # column/FK metadata of a Table subclass, collected once when the class is created
+    # (instead of inspect.getmembers() on every statement) + the statements built from it
+    def __init__(self, table):
+        self.name = table.__name__.lower()
+        self.members = []  # [(attribute name, Column | ForeignKey)] sorted by name
+        for name in dir(table):
+            field = getattr(table, name, None)
+            if isinstance(field, (Column, ForeignKey)):
+                self.members.append((name, field))
+        self.columns = [(name, field) for name, field in self.members if isinstance(field, Column)]
+        self.foreign_keys = [
+            (name, field) for name, field in self.members if isinstance(field, ForeignKey)
+        ]
+        # db column names in select order
+        self.fields = ["id"] + [
+            name if isinstance(field, Column) else f"{name}_id" for name, field in self.members
+        ]
+        # attribute or column name -> column name ('author' and 'author_id' -> 'author_id')
+        self.column_names = {"id": "id"}
+        for name, field in self.members:
+            column = name if isinstance(field, Column) else f"{name}_id"
+            self.column_names[name] = self.column_names[column] = column
+        # FK columns of a row -> loaded into the FK attribute, not kept as they are
+        self.fk_columns = frozenset(f"{name}_id" for name, _ in self.foreign_keys)
+        # what _data of a fully loaded instance has (.only() leaves some out)
+        self.attributes = frozenset(name for name, _ in self.members)
+        self.table_name = table.__name__
+        self.indexes = self._get_indexes(table)
+        # tuple-backed read-only record for raw=True loads: no per-row dict, plain attribute access
+        self.row_class = namedtuple(f"{table.__name__}Row", self.fields)
+        self.row_classes = {tuple(self.fields): self.row_class}
+        # the table + every table its FKs (transitively) point to => what a load may read
+        self.dependencies = [table]
+        for _, fk in self.foreign_keys:
+            for dependency in fk.table._schema.dependencies:
+                if dependency not in self.dependencies:
+                    self.dependencies.append(dependency)
+        self.sql = {}
+
+    def _get_indexes(self, table):
+        # -> [(index name, columns, unique)]: Column(index=True), FKs and Meta.indexes
+        indexes = []
+        for name, field in self.members:
+            if field.index:
+                indexes.append(Index(name))
+        meta = getattr(table, "Meta", None)
+        indexes.extend(getattr(meta, "indexes", ()))
+
+        result = []
+        for index in indexes:
+            columns = [self.get_column(name) for name in index.columns]
+            index_name = index.name or f"idx_{self.name}_{'_'.join(columns)}"
+            if all(index_name != name for name, _, _ in result):
+                result.append((index_name, columns, index.unique))
+        return result
+
+    def get_column(self, name):
+        try:
+            return self.column_names[name]
+        except KeyError:
+            raise ValueError(f"{self.table_name}.{name} is not a column") from None
+
+    def get_row_class(self, fields):
+        # raw rows of .only() projections get their own record type
+        fields = tuple(fields)
+        row_class = self.row_classes.get(fields)
+        if row_class is None:
+            row_class = namedtuple(f"{self.table_name}Row", fields)
+            self.row_classes[fields] = row_class
+        return row_class
+
+
 ########################################
 class Column:
-    def __init__(self, column_type):
+    def __init__(self, column_type, index=False, unique=False, nullable=True):
         self.type = column_type
+        self.index = index
+        self.unique = unique
+        self.nullable = nullable
 
     @property
     def sql_type(self):
         return SQLITE_TYPE_MAP[self.type]
 
+    @property
+    def constraints(self):
+        constraints = ""
+        if not self.nullable:
+            constraints += " NOT NULL"
+        if self.unique:
+            constraints += " UNIQUE"
+        return constraints
+
+
+class Index:
+    # composite index, declared in 'class Meta: indexes = [Index("title", "published")]'
+    def __init__(self, *columns, unique=False, name=None):
+        self.columns = columns
+        self.unique = unique
+        self.name = name
+
 
 ########################################
 class ForeignKey:
-    def __init__(self, table):
+    def __init__(self, table, index=True):
         self.table = table  # TODO: rename
+        self.index = index  # '<name>_id' lookups (filters, reverse relations) shouldn't scan
+
+
+class ForeignKeyProxy:
+    # stands in for a lazily loaded FK object -> 'id' is known, everything else hits the db once
+    __slots__ = ("id", "_db", "_table", "_instance")
+
+    def __init__(self, db, table, id):
+        self.id = id
+        self._db = db
+        self._table = table
+        self._instance = None
+
+    def _load(self):
+        if self._instance is None:
+            self._instance = self._db.get_by_id(self._table, self.id)
+        return self._instance
+
+    def __getattr__(self, key):
+        return getattr(self._load(), key)
+
+    def __repr__(self):
+        return f"<ForeignKeyProxy {self._table.__name__} id={self.id}>"
 
 
 #########################################
@@ -263,17 +1076,44 @@ class QueryObject:
         self.name = table.__name__.lower()  # ???
         self.order_dir = " ASC"
         self.order_criteria = None
-        self.filter_data = None
+        self.filter_data = {}
+        self.fields = None
+        self.distinct_rows = False
         self.limit_count = None
+        self.offset_count = None
+        self.after_value = None
+        self.related = ()
+        self.prefetched = ()
+        self.lazy_load = False
+        self.raw = False
+        self.cache_ttl = None
 
     def where(self, **kwargs):
-        self.filter_data = kwargs
+        # chained where() calls are AND-ed
+        self.filter_data.update(kwargs)
+        return self
+
+    def only(self, *names):
+        # selected columns -> skip e.g. BLOB columns that aren't needed.
+        # Table instances always get their id, as_tuples() rows only the given columns
+        columns = []
+        for name in names:
+            column = self.table._schema.get_column(name)
+            if column not in columns:
+                columns.append(column)
+        self.fields = tuple(columns)
+        return self
+
+    def distinct(self):
+        # rows of the only() columns => with as_tuples(), count() or exists().
+        # Table instances always have their id, so every row would be distinct anyway
+        self.distinct_rows = True
         return self
 
     def order_by(self, criteria, desc=False):
-        self.order_criteria = criteria
-        if desc:
-            self.order_dir = " DESC"
+        # column names only, never interpolated as given
+        self.order_criteria = self.table._schema.get_column(criteria)
+        self.order_dir = " DESC" if desc else " ASC"
         return self
 
     def limit(self, count=None):
@@ -281,31 +1121,98 @@ class QueryObject:
             self.limit_count = count
         return self
 
+    def offset(self, count):
+        self.offset_count = count
+        return self
+
+    def after(self, value):
+        # keyset pagination -> rows after the last seen value of the order_by column (default id).
+        # Unlike offset() sqlite doesn't have to skip the previous pages row by row
+        self.after_value = value
+        return self
+
+    def select_related(self, *names):
+        self.related = names
+        return self
+
+    def prefetch_related(self, *names):
+        self.prefetched = names
+        return self
+
+    def lazy(self):
+        self.lazy_load = True
+        return self
+
+    def as_tuples(self):
+        # namedtuple rows of the table's own columns, select_related/prefetch_related are ignored
+        self.raw = True
+        return self
+
+    def cache(self, ttl):
+        # results are kept for ttl seconds, or until one of the tables they're built from is written
+        self.cache_ttl = ttl
+        return self
+
     def execute(self):
         # similar db.filter
-        sql, fields, params = self.table._get_select_where_sql(**self.filter_data)
-        if self.order_criteria:
-            sql += f" ORDER BY {self.order_criteria}"  # TODO: parametrize order_criteria -> bug in sqlite!?
-            sql += self.order_dir
-        if self.limit_count:
-            sql += " LIMIT ?"
-            params.append(self.limit_count)
-
-        rows = self.db.conn.execute(sql, params).fetchall()
-        if len(rows) == 0:
-            return rows
+        if self.cache_ttl:
+            return self.db._load_cached(
+                self.cache_ttl,
+                self.table,
+                *self._get_sql(),
+                self.prefetched,
+                self.lazy_load,
+                self.raw,
+            )
+        return self.db._load(
+            self.table, *self._get_sql(), self.prefetched, self.lazy_load, self.raw
+        )
 
-        result = []
-        for row in rows:
-            instance = type(self.table.__name__, (), {})  # new instance of type self.table
-            for field, value in zip(fields, row):
-                if field.endswith("_id"):
-                    field = field[:-3]
-                    fk = getattr(self.table, field)
-                    value = self.db.get_by_id(fk.table, id=value)
-                # elif getattr(self.table, field, None):
-                #     if type(getattr(self.table, field)) is bool:
-                #         value = True
-                setattr(instance, field, value)
-            result.append(instance)
-        return result
+    def iterate(self, chunk_size=ITER_CHUNK_SIZE):
+        return self.db._iter_load(
+            self.table, *self._get_sql(), self.prefetched, self.lazy_load, chunk_size, self.raw
+        )
+
+    def count(self):
+        # counted by sqlite, no rows are fetched
+        sql, params, _, _ = self._get_sql(related=(), rows_only=True)
+        return self.db._execute(f"SELECT COUNT(*) FROM ({sql})", params, fetch="one")[0]
+
+    def exists(self):
+        sql, params, _, _ = self._get_sql(related=(), rows_only=True)
+        return bool(self.db._execute(f"SELECT EXISTS ({sql})", params, fetch="one")[0])
+
+    def _get_sql(self, related=None, rows_only=False):
+        # -> sql, params, fields, related; rows_only -> the rows aren't built into Table instances
+        rows_only = rows_only or self.raw
+        if self.distinct_rows and not rows_only:
+            raise ValueError("distinct() needs as_tuples(), count() or exists()")
+        if related is None:
+            related = () if self.raw else self.related
+        filters = list(self.filter_data.items())
+        order_criteria = self.order_criteria
+        if self.after_value is not None:
+            order_criteria = order_criteria or "id"
+            lookup = "lt" if self.order_dir == " DESC" else "gt"
+            filters.append((f"{order_criteria}__{lookup}", self.after_value))
+
+        fields = self.fields
+        if fields is not None and "id" not in fields and not rows_only:
+            fields = ("id", *fields)
+        has_limit = self.limit_count is not None or bool(self.offset_count)
+        sql, fields, related = self.db._compile_query(
+            self.table,
+            fields,
+            tuple(related),
+            _get_filters_shape(filters),
+            self.distinct_rows,
+            order_criteria and f"{order_criteria}{self.order_dir}",
+            has_limit,
+            bool(self.offset_count),
+        )
+        params = _get_filters_params(filters)
+        if has_limit:
+            params.append(self.limit_count if self.limit_count is not None else -1)
+        if self.offset_count:
+            params.append(self.offset_count)
+        return sql, params, fields, related
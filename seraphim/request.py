@@ -0,0 +1,216 @@
+import io
+from collections.abc import Mapping
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.cookies import SimpleCookie
+from json import loads as json_loads
+from urllib.parse import parse_qs, quote
+
+# every lazily parsed attribute starts as _UNSET -> the environ is only touched on first access
+_UNSET = object()
+
+
+class Headers(Mapping):
+    # read-only, case-insensitive view over the HTTP_* keys of a WSGI environ
+    __slots__ = ("environ",)
+
+    def __init__(self, environ):
+        self.environ = environ
+
+    @staticmethod
+    def _environ_key(name):
+        key = name.upper().replace("-", "_")
+        if key in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            return key
+        return f"HTTP_{key}"
+
+    def __getitem__(self, name):
+        return self.environ[self._environ_key(name)]
+
+    def __contains__(self, name):
+        return self._environ_key(name) in self.environ
+
+    def __iter__(self):
+        for key in self.environ:
+            if key.startswith("HTTP_"):
+                yield key[5:].replace("_", "-").title()
+            elif key in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+                yield key.replace("_", "-").title()
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class Request:
+    __slots__ = (
+        "environ",
+        "route",
+        "_path",
+        "_headers",
+        "_query",
+        "_params",
+        "_form",
+        "_cookies",
+        "_body",
+    )
+
+    def __init__(self, environ):
+        self.environ = environ
+        self.route = None  # matched route data, set by API.handle_request
+        self._path = _UNSET
+        self._headers = _UNSET
+        self._query = _UNSET
+        self._params = _UNSET
+        self._form = _UNSET
+        self._cookies = _UNSET
+        self._body = _UNSET
+
+    @property
+    def method(self):
+        return self.environ["REQUEST_METHOD"]
+
+    @property
+    def path(self):
+        if self._path is _UNSET:
+            # WSGI strings carry the raw bytes as latin-1
+            path = self.environ.get("SCRIPT_NAME", "") + self.environ.get("PATH_INFO", "")
+            self._path = path.encode("latin1").decode("utf-8", "replace")
+        return self._path
+
+    @property
+    def query_string(self):
+        return self.environ.get("QUERY_STRING", "")
+
+    @property
+    def scheme(self):
+        return self.environ.get("wsgi.url_scheme", "http")
+
+    @property
+    def host(self):
+        host = self.environ.get("HTTP_HOST")
+        if host is None:
+            host = self.environ.get("SERVER_NAME", "localhost")
+            port = self.environ.get("SERVER_PORT")
+            if port and port != ("443" if self.scheme == "https" else "80"):
+                host = f"{host}:{port}"
+        return host
+
+    @property
+    def url(self):
+        url = f"{self.scheme}://{self.host}{quote(self.path)}"
+        if self.query_string:
+            url = f"{url}?{self.query_string}"
+        return url
+
+    @property
+    def remote_addr(self):
+        return self.environ.get("REMOTE_ADDR")
+
+    @property
+    def content_type(self):
+        return self.environ.get("CONTENT_TYPE", "").split(";", 1)[0].strip()
+
+    @property
+    def content_length(self):
+        try:
+            return int(self.environ.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            return 0
+
+    @property
+    def headers(self):
+        if self._headers is _UNSET:
+            self._headers = Headers(self.environ)
+        return self._headers
+
+    @property
+    def GET(self):
+        # query string fields, last value wins for repeated keys (like WebOb's MultiDict)
+        if self._query is _UNSET:
+            self._query = _parse_qs(self.query_string)
+        return self._query
+
+    @property
+    def POST(self):
+        # urlencoded or multipart form fields, uploaded files come as UploadedFile
+        if self._form is _UNSET:
+            self._form = {}
+            content_type = self.content_type
+            if content_type == "application/x-www-form-urlencoded":
+                self._form = _parse_qs(self.text)
+            elif content_type == "multipart/form-data":
+                self._form = _parse_multipart(self.environ["CONTENT_TYPE"], self.body)
+        return self._form
+
+    @property
+    def params(self):
+        # GET and POST together like WebOb's, the query string wins on conflicts
+        if self._params is _UNSET:
+            form = self.POST
+            self._params = {**form, **self.GET} if form else self.GET
+        return self._params
+
+    @property
+    def cookies(self):
+        if self._cookies is _UNSET:
+            cookie = SimpleCookie()
+            cookie.load(self.environ.get("HTTP_COOKIE", ""))
+            self._cookies = {name: morsel.value for name, morsel in cookie.items()}
+        return self._cookies
+
+    @property
+    def body(self):
+        if self._body is _UNSET:
+            length = self.content_length
+            stream = self.environ.get("wsgi.input")
+            self._body = stream.read(length) if length and stream is not None else b""
+        return self._body
+
+    @property
+    def text(self):
+        return self.body.decode("utf-8")
+
+    @property
+    def json(self):
+        return json_loads(self.body)
+
+
+class UploadedFile:
+    # a multipart file field, same attribute names as WebOb's FieldStorage
+    __slots__ = ("filename", "type", "value")
+
+    def __init__(self, filename, type, value):
+        self.filename = filename
+        self.type = type
+        self.value = value
+
+    @property
+    def file(self):
+        return io.BytesIO(self.value)
+
+    def __repr__(self):
+        return f"UploadedFile({self.filename!r}, {self.type!r}, {len(self.value)} bytes)"
+
+
+def _parse_qs(query):
+    return {key: values[-1] for key, values in parse_qs(query, keep_blank_values=True).items()}
+
+
+def _parse_multipart(content_type, body):
+    # the email parser handles boundaries and part headers, payloads come back byte for byte
+    header = f"Content-Type: {content_type}\r\n\r\n".encode("latin1")
+    message = BytesParser(policy=HTTP).parsebytes(header + body)
+    if not message.is_multipart():
+        return {}
+    form = {}
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        if name is None:
+            continue
+        value = part.get_payload(decode=True) or b""
+        filename = part.get_filename()
+        if filename is None:
+            form[name] = value.decode(part.get_content_charset("utf-8"), "replace")
+        else:
+            form[name] = UploadedFile(filename, part.get_content_type(), value)
+    return form
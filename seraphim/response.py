@@ -1,29 +1,97 @@
-import json
+import mimetypes
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from http import HTTPStatus
 
-from webob import Response as WebObResponse
+from .encoders import encode_json, get_json_encoder, iter_json_array
+
+STATUS_LINES = {status.value: f"{status.value} {status.phrase}" for status in HTTPStatus}
+DEFAULT_CONTENT_TYPE = "text/html"
+FILE_CONTENT_TYPE = "application/octet-stream"
+FILE_CHUNK_SIZE = 64 * 1024
+TEMPLATE_STREAM_BUFFER_SIZE = 64
+BODYLESS_STATUSES = (204, 304)
 
 
 class Response:
-    def __init__(self):
+    __slots__ = (
+        "json",
+        "json_stream",
+        "html",
+        "text",
+        "content_type",
+        "body",
+        "stream",
+        "file",
+        "status_code",
+        "headers",
+        "json_encoder",
+        "templates_env",
+    )
+
+    def __init__(self, json_encoder=None, templates_env=None):
         self.json = None
+        self.json_stream = None
         self.html = None
         self.text = None
         self.content_type = None
         self.body = b""
+        self.stream = None
+        self.file = None
         self.status_code = 200
+        self.headers = {}
+        self.json_encoder = json_encoder if json_encoder is not None else get_json_encoder()
+        self.templates_env = templates_env
 
     def __call__(self, environ, start_response):
         self.set_body_and_content_type()
-        response = WebObResponse(
-            body=self.body,
-            content_type=self.content_type,
-            status=self.status_code,
-        )
-        return response(environ, start_response)
+        if self.file is not None:
+            return self._send_file(environ, start_response)
+
+        if self.status_code in BODYLESS_STATUSES or self.status_code < 200:
+            # no body, and a Content-Length would have to match the one of the 200 (RFC 9110)
+            if hasattr(self.stream, "close"):
+                self.stream.close()
+            start_response(self.status, list(self.headers.items()))
+            return []
+
+        headers = [("Content-Type", self.get_content_type_header())]
+        if self.stream is not None:
+            headers.extend(self.headers.items())
+            start_response(self.status, headers)
+            return self.stream
+
+        headers.append(("Content-Length", str(len(self.body))))
+        headers.extend(self.headers.items())
+        start_response(self.status, headers)
+        return [self.body]
+
+    def template_stream(self, template_name, context=None):
+        # renders lazily while the body is sent -> large pages never sit in memory as a whole
+        if context is None:
+            context = {}
+        stream = self.templates_env.get_template(template_name).stream(**context)
+        stream.enable_buffering(TEMPLATE_STREAM_BUFFER_SIZE)
+        self.stream = (chunk.encode() for chunk in stream)
+        self.content_type = "text/html"
+
+    @property
+    def status(self):
+        return STATUS_LINES.get(self.status_code) or f"{self.status_code} Unknown"
+
+    def get_content_type_header(self):
+        content_type = self.content_type or DEFAULT_CONTENT_TYPE
+        if content_type.startswith("text/") and "charset=" not in content_type:
+            content_type = f"{content_type}; charset=UTF-8"
+        return content_type
 
     def set_body_and_content_type(self):
         if self.json is not None:
-            self.body = json.dumps(self.json).encode("UTF-8")
+            self.body = encode_json(self.json_encoder, self.json)
+            self.content_type = "application/json"
+
+        if self.json_stream is not None:
+            self.stream = iter_json_array(self.json_stream, self.json_encoder)
             self.content_type = "application/json"
 
         if self.html is not None:
@@ -31,5 +99,162 @@ class Response:
             self.content_type = "text/html"
 
         if self.text is not None:
-            self.body = self.text
+            self.body = self.text.encode()
             self.content_type = "text/plain"
+
+        if isinstance(self.body, str):
+            self.body = self.body.encode()
+
+        # rendered once -> later calls (from middlewares or __call__) keep the body as it is
+        self.json = self.json_stream = self.html = self.text = None
+
+    def _send_file(self, environ, start_response):
+        file, position, size, mtime = _open_file(self.file)
+        if self.content_type is None:
+            name = getattr(file, "name", None)
+            guessed_type = mimetypes.guess_type(name)[0] if isinstance(name, str) else None
+            self.content_type = guessed_type or FILE_CONTENT_TYPE
+
+        file_headers = [("Accept-Ranges", "bytes")]
+        etag = None
+        if mtime is not None:
+            etag = f'"{int(mtime):x}-{size:x}"'
+            file_headers.append(("ETag", etag))
+            file_headers.append(("Last-Modified", formatdate(mtime, usegmt=True)))
+        file_headers.extend(self.headers.items())
+
+        # conditional and range requests only apply to a plain 200, a status picked by the handler
+        # (e.g. 201) is sent as is, with the whole file
+        is_ok = self.status_code == 200
+        if is_ok and _is_not_modified(environ, etag, mtime):
+            file.close()
+            self.status_code = 304
+            start_response(self.status, file_headers)
+            return []
+
+        byte_range = None
+        if is_ok and _range_applies(environ, etag, mtime):
+            byte_range = _parse_range(environ.get("HTTP_RANGE"), size)
+            if byte_range is False:
+                file.close()
+                self.status_code = 416
+                start_response(self.status, [("Content-Range", f"bytes */{size}"), *file_headers])
+                return []
+
+        headers = [("Content-Type", self.get_content_type_header())]
+        if byte_range is None:
+            headers.append(("Content-Length", str(size)))
+            start_response(self.status, headers + file_headers)
+            file_wrapper = environ.get("wsgi.file_wrapper")
+            if file_wrapper is not None:
+                # lets servers like gunicorn use sendfile()
+                return file_wrapper(file, FILE_CHUNK_SIZE)
+            return _iter_file(file, size)
+
+        start, end = byte_range
+        self.status_code = 206
+        headers.append(("Content-Length", str(end - start + 1)))
+        headers.append(("Content-Range", f"bytes {start}-{end}/{size}"))
+        start_response(self.status, headers + file_headers)
+        file.seek(position + start)  # ranges count from where the file object was handed over
+        return _iter_file(file, end - start + 1)
+
+
+def find_header(headers, name):
+    # Response.headers is a plain dict filled by handlers -> names may come in any case.
+    # The key used for name, None if it isn't set
+    if name in headers:
+        return name
+    lowered = name.lower()
+    for key in headers:
+        if key.lower() == lowered:
+            return key
+    return None
+
+
+def get_header(headers, name, default=None):
+    key = find_header(headers, name)
+    return default if key is None else headers[key]
+
+
+def _open_file(file):
+    # path or binary file object -> (file, position, size, mtime), the body starts at position;
+    # mtime is None for in-memory files
+    if isinstance(file, (str, os.PathLike)):
+        file = open(file, "rb")
+    position = file.tell()
+    try:
+        stat = os.fstat(file.fileno())
+        return file, position, stat.st_size - position, stat.st_mtime
+    except (AttributeError, OSError):
+        size = file.seek(0, os.SEEK_END) - position
+        file.seek(position)
+        return file, position, size, None
+
+
+def _iter_file(file, length):
+    try:
+        while length > 0:
+            chunk = file.read(min(FILE_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def _is_not_modified(environ, etag, mtime):
+    if environ.get("REQUEST_METHOD") not in ("GET", "HEAD") or mtime is None:
+        return False
+    if_none_match = environ.get("HTTP_IF_NONE_MATCH")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    return _not_modified_since(environ.get("HTTP_IF_MODIFIED_SINCE"), mtime)
+
+
+def _not_modified_since(header, mtime):
+    if not header:
+        return False
+    try:
+        return int(mtime) <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+def _range_applies(environ, etag, mtime):
+    if "HTTP_RANGE" not in environ or environ.get("REQUEST_METHOD") != "GET":
+        return False
+    if_range = environ.get("HTTP_IF_RANGE")
+    if if_range is None:
+        return True
+    if if_range.startswith(('"', "W/")):
+        return etag is not None and if_range == etag
+    return mtime is not None and _not_modified_since(if_range, mtime)
+
+
+def _parse_range(header, size):
+    # single 'bytes=' ranges only -> (start, end) inclusive, None to ignore the header
+    # (multiple or malformed ranges), False when the range can't be satisfied
+    unit, _, ranges = header.partition("=")
+    if unit.strip() != "bytes" or "," in ranges:
+        return None
+    if size == 0:
+        return False
+    first, _, last = ranges.strip().partition("-")
+    try:
+        if not first:
+            suffix = int(last)
+            if suffix <= 0:
+                return False
+            return max(size - suffix, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        return False
+    if start > end:
+        return None
+    return start, min(end, size - 1)
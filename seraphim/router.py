@@ -0,0 +1,102 @@
+import re
+
+from parse import compile as compile_pattern
+
+SIMPLE_PARAM_RE = re.compile(r"^\{(\w+)\}$")
+
+
+class Node:
+    __slots__ = ("static", "params", "data", "order", "min_order")
+
+    def __init__(self):
+        self.static = {}
+        # [(segment, name, parser, child)] -> name is set for plain '{name}' segments,
+        # parser is a compiled 'parse' pattern for typed/mixed segments ('{id:d}', 'v{num}.json')
+        self.params = []
+        self.data = None
+        self.order = None
+        self.min_order = None
+
+
+# segment trie compiled at registration time -> static segments are resolved with a dict lookup,
+# parameter segments are matched one at a time => lookup costs O(path depth) instead of O(routes).
+# Routes registered earlier win when several patterns match (same as the former linear 'parse' scan)
+class Router:
+    def __init__(self):
+        self.root = Node()
+        self.count = 0
+
+    def add(self, path, data):
+        order = self.count
+        self.count += 1
+
+        node = self.root
+        self._update_min_order(node, order)
+        for segment in path.split("/"):
+            node = self._get_or_create_child(node, segment)
+            self._update_min_order(node, order)
+        node.data = data
+        node.order = order
+
+    def match(self, request_path):
+        result = self._match(self.root, request_path.split("/"), 0, {}, None)
+        if result is None:
+            return None, None
+        _, data, kwargs = result
+        return data, kwargs
+
+    @staticmethod
+    def _update_min_order(node, order):
+        if node.min_order is None or order < node.min_order:
+            node.min_order = order
+
+    @staticmethod
+    def _get_or_create_child(node, segment):
+        if "{" not in segment and "}" not in segment:
+            # literal parts are matched case-insensitively like 'parse' does
+            key = segment.lower()
+            child = node.static.get(key)
+            if child is None:
+                child = node.static[key] = Node()
+            return child
+
+        for param_segment, _, _, child in node.params:
+            if param_segment == segment:
+                return child
+
+        child = Node()
+        simple_param = SIMPLE_PARAM_RE.match(segment)
+        if simple_param is not None:
+            node.params.append((segment, simple_param.group(1), None, child))
+        else:
+            node.params.append((segment, None, compile_pattern(segment), child))
+        return child
+
+    def _match(self, node, segments, index, kwargs, best):
+        # best -> (order, data, kwargs) of the earliest registered route matched so far
+        if best is not None and node.min_order >= best[0]:
+            return best
+
+        if index == len(segments):
+            if node.data is not None and (best is None or node.order < best[0]):
+                return node.order, node.data, kwargs
+            return best
+
+        segment = segments[index]
+        child = node.static.get(segment.lower())
+        if child is not None:
+            best = self._match(child, segments, index + 1, kwargs, best)
+
+        for _, name, parser, child in node.params:
+            if name is not None:
+                if not segment:
+                    continue
+                best = self._match(child, segments, index + 1, {**kwargs, name: segment}, best)
+            else:
+                parse_result = parser.parse(segment)
+                if parse_result is None:
+                    continue
+                best = self._match(
+                    child, segments, index + 1, {**kwargs, **parse_result.named}, best
+                )
+        return best
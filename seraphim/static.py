@@ -0,0 +1,96 @@
+# Static files index + precompression.
+# Generate .gz/.br siblings at build/deploy time with: python -m seraphim.static <static_dir>
+import argparse
+import os
+import re
+
+from whitenoise import WhiteNoise
+from whitenoise.compress import Compressor
+
+# content hash in the file name (e.g. main.3f2a9c1b.css) => a new url for every new content
+HASHED_FILE_RE = re.compile(r"\.[0-9a-f]{8,}\.[^./]+$")
+
+
+def is_hashed_file(path, url):
+    return HASHED_FILE_RE.search(url) is not None
+
+
+class StaticFiles:
+    # static_dir is scanned once: url -> whitenoise StaticFile, with the stat results, headers
+    # and the .gz/.br siblings resolved up front => serving a request is a dict lookup.
+    # Files added later aren't served until scan() runs again.
+    # immutable_file_test -> callable(path, url) or regex on the url, matching files are cached
+    # forever (Cache-Control: immutable), the rest for max_age seconds
+    def __init__(self, root, url="/static", max_age=60, immutable_file_test=is_hashed_file):
+        self.root = root
+        self.url = url
+        self.whitenoise = WhiteNoise(None, max_age=max_age, immutable_file_test=immutable_file_test)
+        self.files = {}
+        self.scan()
+
+    def scan(self):
+        whitenoise = self.whitenoise
+        whitenoise.files = {}
+        whitenoise.add_files(self.root, prefix=self.url)
+        # keyed by WSGI strings (raw bytes as latin-1) => PATH_INFO is looked up as is.
+        # Swapped in one go -> requests served meanwhile see either the old or the new index
+        self.files = {
+            url.encode("utf-8").decode("latin-1"): static_file
+            for url, static_file in whitenoise.files.items()
+        }
+        return len(self.files)
+
+    def find(self, path_info):
+        return self.files.get(path_info)
+
+    @staticmethod
+    def serve(static_file, environ, start_response):
+        # picks the encoding from Accept-Encoding, answers If-None-Match/If-Modified-Since with 304
+        return WhiteNoise.serve(static_file, environ, start_response)
+
+    def compress(self, skip_extensions=None, use_brotli=True):
+        written = compress_static(self.root, skip_extensions, use_brotli)
+        self.scan()
+        return written
+
+
+def compress_static(root, skip_extensions=None, use_brotli=True, log=None):
+    # writes <file>.gz (and <file>.br when brotli is installed) next to every compressible file,
+    # skipping those that wouldn't shrink enough. Returns the written paths
+    compressor = Compressor(
+        extensions=skip_extensions,
+        use_brotli=use_brotli,
+        log=log or print,
+        quiet=log is None,
+    )
+    written = []
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            if compressor.should_compress(filename):
+                written.extend(compressor.compress(os.path.join(dirpath, filename)))
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m seraphim.static")
+    parser.add_argument("root", help="static files directory")
+    parser.add_argument("--no-brotli", action="store_true", help="gzip only")
+    parser.add_argument("--quiet", action="store_true")
+    parser.add_argument(
+        "--skip",
+        nargs="*",
+        help="file extensions not to compress (default: images, fonts, videos, archives)",
+    )
+    args = parser.parse_args(argv)
+    written = compress_static(
+        args.root,
+        skip_extensions=args.skip,
+        use_brotli=not args.no_brotli,
+        log=None if args.quiet else print,
+    )
+    if not args.quiet:
+        print(f"{len(written)} files written")
+
+
+if __name__ == "__main__":
+    main()
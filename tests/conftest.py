@@ -17,12 +17,23 @@ def client(api):
     return api.test_session()
 
 
+@pytest.fixture
+def asgi_client(api):
+    return api.asgi_test_client()
+
+
+def _remove_db_files():
+    for path in (DB_PATH, f"{DB_PATH}-wal", f"{DB_PATH}-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+
+
 @pytest.fixture
 def db():
-    if os.path.exists(DB_PATH):
-        os.remove(DB_PATH)
+    _remove_db_files()
     db = Database(DB_PATH)
-    return db
+    yield db
+    db.close()
 
 
 @pytest.fixture
@@ -1,12 +1,39 @@
-import pytest
-
-
 def test_allowed_methods_for_function_based_handlers(api, client):
     @api.route("/home", allowed_methods=["post"])
     def home(req, resp):
         resp.text = "Hello"
 
-    with pytest.raises(AttributeError):
-        client.get("http://testserver/home")
+    response = client.get("http://testserver/home")
+    assert response.status_code == 405
+    assert response.headers["Allow"] == "POST"
 
     assert client.post("http://testserver/home").text == "Hello"
+
+
+def test_allowed_methods_for_class_based_handlers(api, client):
+    @api.route("/book", allowed_methods=["get", "put"])
+    class BookResource:
+        def get(self, req, resp):
+            resp.text = "get"
+
+        def post(self, req, resp):
+            resp.text = "post"
+
+        def put(self, req, resp):
+            resp.text = "put"
+
+    assert api.routes["/book"]["allowed_methods"] == frozenset({"get", "put"})
+    assert client.get("http://testserver/book").text == "get"
+    assert client.put("http://testserver/book").text == "put"
+
+    response = client.post("http://testserver/book")
+    assert response.status_code == 405
+    assert response.headers["Allow"] == "GET, PUT"
+
+
+def test_allowed_methods_are_case_insensitive(api, client):
+    @api.route("/home", allowed_methods=["GET"])
+    def home(req, resp):
+        resp.text = "Hello"
+
+    assert client.get("http://testserver/home").text == "Hello"
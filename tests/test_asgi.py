@@ -0,0 +1,199 @@
+import asyncio
+import threading
+
+from seraphim import API
+from seraphim.asgi import build_environ, send_wsgi_response
+from seraphim.middleware import Middleware
+
+
+def test_async_function_handler(api, asgi_client):
+    @api.route("/hello/{name}")
+    async def hello(req, resp, name):
+        await asyncio.sleep(0)
+        resp.text = f"hey {name}"
+
+    response = asgi_client.get("/hello/matthew")
+    assert response.status_code == 200
+    assert "text/plain" in response.headers["Content-Type"]
+    assert response.text == "hey matthew"
+
+
+def test_async_class_based_handler(api, asgi_client):
+    @api.route("/book")
+    class BookResource:
+        async def get(self, req, resp):
+            resp.json = {"method": "get"}
+
+        async def post(self, req, resp):
+            resp.json = {"method": "post", "body": req.json}
+
+    assert asgi_client.get("/book").json() == {"method": "get"}
+    assert asgi_client.post("/book", json={"title": "ORM"}).json() == {
+        "method": "post",
+        "body": {"title": "ORM"},
+    }
+
+
+def test_sync_handler_runs_in_thread(api, asgi_client):
+    handler_thread = None
+
+    @api.route("/sync")
+    def sync_handler(req, resp):
+        nonlocal handler_thread
+        handler_thread = threading.current_thread()
+        resp.text = "sync"
+
+    assert asgi_client.get("/sync").text == "sync"
+    assert handler_thread is not threading.main_thread()
+
+
+def test_async_handler_through_wsgi(api, client):
+    @api.route("/async")
+    async def async_handler(req, resp):
+        resp.text = "awaited"
+
+    assert client.get("http://testserver/async").text == "awaited"
+
+
+def test_asgi_default_404_response(asgi_client):
+    response = asgi_client.get("/doesnotexist")
+    assert response.status_code == 404
+    assert response.text == "Not found."
+
+
+def test_asgi_concurrent_long_poll(api, asgi_client):
+    @api.route("/poll/{key}")
+    async def poll(req, resp, key):
+        await asyncio.sleep(0.05)
+        resp.text = key
+
+    async def run():
+        return await asyncio.gather(
+            *(asgi_client.request_async("GET", f"/poll/{i}") for i in range(50))
+        )
+
+    loop = asyncio.new_event_loop()
+    try:
+        start = loop.time()
+        responses = loop.run_until_complete(run())
+        elapsed = loop.time() - start
+    finally:
+        loop.close()
+
+    assert [r.text for r in responses] == [str(i) for i in range(50)]
+    assert elapsed < 1
+
+
+def test_asgi_middleware_methods_are_called(api, asgi_client):
+    calls = []
+
+    class CallMiddlewareMethods(Middleware):
+        def process_request(self, req):
+            calls.append("request")
+
+        def process_response(self, req, resp):
+            calls.append("response")
+
+    api.add_middleware(CallMiddlewareMethods)
+
+    @api.route("/")
+    async def index(req, resp):
+        resp.text = "HELLO"
+
+    assert asgi_client.get("/").text == "HELLO"
+    assert calls == ["request", "response"]
+
+
+def test_asgi_custom_exception_handler(api, asgi_client):
+    def on_exception(req, resp, exc):
+        resp.text = "AttributeErrorHappened"
+
+    api.add_exception_handler(on_exception)
+
+    @api.route("/")
+    async def index(req, resp):
+        raise AttributeError()
+
+    assert asgi_client.get("/").text == "AttributeErrorHappened"
+
+
+def test_asgi_static_files(tmpdir_factory):
+    static_dir = tmpdir_factory.mktemp("static")
+    static_dir.join("main.css").write("body {background-color: red}")
+    api = API(static_dir=str(static_dir))
+
+    response = api.asgi_test_client().get("/static/main.css")
+    assert response.status_code == 200
+    assert response.text == "body {background-color: red}"
+
+
+def test_asgi_precompressed_static_files(tmpdir_factory):
+    static_dir = tmpdir_factory.mktemp("static")
+    static_dir.join("main.css").write("body {background-color: red}" * 100)
+    api = API(static_dir=str(static_dir), static_url="/assets")
+    api.compress_static(use_brotli=False)
+    client = api.asgi_test_client()
+
+    response = client.get("/assets/main.css", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+
+    response = client.get("/assets/main.css", headers={"If-None-Match": response.headers["etag"]})
+    assert response.status_code == 304
+
+
+def test_asgi_websocket_is_rejected(api):
+    sent = []
+
+    async def receive():
+        return {"type": "websocket.connect"}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(api.asgi({"type": "websocket", "path": "/ws"}, receive, send))
+    assert sent == [{"type": "websocket.close", "code": 1000}]
+
+
+def test_asgi_streams_reuse_threads(api, asgi_client, db, Author):
+    db.create(Author)
+    db.bulk_save([Author(name=f"Author {index}", age=index) for index in range(10)])
+    threads = set()
+
+    @api.route("/export")
+    def export(req, resp):
+        def rows():
+            threads.add(threading.get_ident())
+            for author in db.iter_all(Author):
+                yield f"{author.name}\n".encode()
+
+        resp.stream = rows()
+
+    for _ in range(50):
+        assert asgi_client.get("/export").text.count("\n") == 10
+
+    # one per-thread connection for the test thread, one for the (reused) stream thread
+    assert len(threads) == 1
+    assert len(db._connections) == 2
+
+
+def test_asgi_threaded_wsgi_bodies_are_streamed():
+    produced = []
+    sent = []
+
+    def chunks():
+        for index in range(3):
+            produced.append(index)
+            yield b"chunk"
+
+    def app(environ, start_response):
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        return chunks()
+
+    async def send(message):
+        if message.get("body"):
+            sent.append(len(produced))  # chunks produced by the time this one is sent
+
+    environ = build_environ({"type": "http", "method": "GET", "path": "/"}, b"")
+    asyncio.run(send_wsgi_response(app, environ, send, in_thread=True))
+    assert sent == [1, 2, 3]
@@ -0,0 +1,130 @@
+import asyncio
+import threading
+
+import pytest
+
+from seraphim import AsyncDatabase
+
+
+@pytest.fixture
+def adb(tmp_path):
+    db = AsyncDatabase(str(tmp_path / "async.db"), max_workers=2)
+    yield db
+    db.close()
+
+
+async def _create_library(adb, Author, Book):
+    await adb.create(Author)
+    await adb.create(Book)
+    authors = [Author(name=f"Author {i}", age=30 + i) for i in range(3)]
+    await adb.bulk_save(authors)
+    await adb.bulk_save(
+        [Book(title=f"Book {i}", published=i % 2 == 0, author=authors[i % 3]) for i in range(30)]
+    )
+    return authors
+
+
+def test_async_database_api(adb, Author, Book):
+    async def main():
+        authors = await _create_library(adb, Author, Book)
+        book = await adb.get_by_id(Book, 4)
+        published = await adb.filter(Book, published=True)
+        everything = await adb.get_all(Book, select_related=("author",))
+
+        authors[0].name = "Renamed"
+        await adb.update(authors[0])
+        await adb.delete(Book, 30)
+        return book, published, everything, await adb.get_all(Book), await adb.tables()
+
+    book, published, everything, remaining, tables = asyncio.run(main())
+
+    assert (book.title, book.author.name) == ("Book 3", "Author 0")
+    assert len(published) == 15
+    assert everything[1].author.name == "Author 1"
+    assert len(remaining) == 29
+    assert remaining[0].author.name == "Renamed"
+    assert {"author", "book"} <= set(tables)
+
+
+def test_async_query_object(adb, Author, Book):
+    async def main():
+        await _create_library(adb, Author, Book)
+        query = adb.get(Book).where(published=True, id__gt=20).order_by("id")
+        books = await query.execute()
+        count = await adb.get(Book).where(published=True).count()
+        exists = await adb.get(Book).where(title="Missing").exists()
+        titles = [book.title async for book in query.iterate(chunk_size=2)]
+        ids = [book.id async for book in adb.iter_all(Book, chunk_size=7)]
+        return books, count, exists, titles, ids
+
+    books, count, exists, titles, ids = asyncio.run(main())
+
+    assert [book.id for book in books] == [21, 23, 25, 27, 29]
+    assert count == 15
+    assert exists is False
+    assert titles == ["Book 20", "Book 22", "Book 24", "Book 26", "Book 28"]
+    assert ids == list(range(1, 31))
+
+
+def test_async_database_runs_off_the_event_loop(adb, Author):
+    loop_thread = threading.get_ident()
+    threads = set()
+
+    def slow_query(db):
+        threads.add(threading.get_ident())
+        db.conn.execute("SELECT 1")
+        threading.Event().wait(0.05)
+
+    async def main():
+        await adb.create(Author)
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        await asyncio.gather(*(adb.run(slow_query, adb.db) for _ in range(6)))
+        task.cancel()
+        return ticks
+
+    ticks = asyncio.run(main())
+
+    assert loop_thread not in threads
+    assert len(threads) <= 2
+    assert ticks >= 5  # the event loop kept running while queries were blocked
+    metrics = adb.metrics
+    assert metrics["calls"] == 7
+    assert metrics["running"] == metrics["waiting"] == 0
+    assert metrics["max_waiting"] >= 4
+    assert metrics["max_wait_seconds"] > 0
+
+
+def test_async_database_session(adb, Author, Book):
+    async def main():
+        await _create_library(adb, Author, Book)
+        with adb.session():
+            books = await adb.get_all(Book)
+            author = await adb.get_by_id(Author, 1)
+        return books, author
+
+    books, author = asyncio.run(main())
+
+    assert books[0].author is author
+
+
+def test_async_iteration_runs_in_the_session(adb, Author, Book):
+    async def main():
+        await _create_library(adb, Author, Book)
+        with adb.session():
+            author = await adb.get_by_id(Author, 1)
+            iterated = [item async for item in adb.iter_all(Author)]
+            queried = [item async for item in adb.get(Author).iterate()]
+        return author, iterated, queried
+
+    author, iterated, queried = asyncio.run(main())
+
+    assert iterated[0] is author
+    assert queried[0] is author
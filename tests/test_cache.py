@@ -0,0 +1,138 @@
+import pytest
+
+from seraphim import CacheMiddleware
+from seraphim.cache import LRUCache
+
+
+@pytest.fixture
+def cache(api):
+    return api.add_middleware(CacheMiddleware, max_entries=2)
+
+
+@pytest.fixture
+def calls(api):
+    calls = []
+
+    @api.route("/books", cache=60)
+    def books(req, resp):
+        calls.append(req.params.get("page"))
+        resp.json = {"page": req.params.get("page")}
+
+    @api.route("/live")
+    def live(req, resp):
+        calls.append("live")
+        resp.text = "live"
+
+    return calls
+
+
+def test_cached_route_runs_handler_once(cache, calls, client):
+    first = client.get("http://testserver/books?page=1")
+    second = client.get("http://testserver/books?page=1")
+
+    assert first.json() == second.json() == {"page": "1"}
+    assert second.headers["Content-Type"] == "application/json"
+    assert calls == ["1"]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_cache_key_includes_query_and_vary_headers(cache, calls, client):
+    client.get("http://testserver/books?page=1")
+    client.get("http://testserver/books?page=2")
+    client.get("http://testserver/books?page=1", headers={"Accept": "text/html"})
+
+    assert calls == ["1", "2", "1"]
+    assert cache.hits == 0
+
+
+def test_routes_without_cache_are_not_cached(cache, calls, client):
+    client.get("http://testserver/live")
+    client.get("http://testserver/live")
+
+    assert calls == ["live", "live"]
+    assert (cache.hits, cache.misses) == (0, 0)
+
+
+def test_non_get_requests_bypass_cache(cache, calls, client):
+    client.post("http://testserver/books")
+    client.post("http://testserver/books")
+    assert len(calls) == 2
+
+
+def test_etag_and_conditional_get(cache, calls, client):
+    response = client.get("http://testserver/books?page=1")
+    etag = response.headers["ETag"]
+    assert response.headers["Vary"] == "Accept, Accept-Encoding"
+
+    not_modified = client.get("http://testserver/books?page=1", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert not_modified.headers["ETag"] == etag
+    assert "Content-Length" not in not_modified.headers
+    assert calls == ["1"]
+
+
+def test_lru_eviction(cache, calls, client):
+    for page in ("1", "2", "3", "1"):
+        client.get(f"http://testserver/books?page={page}")
+
+    assert calls == ["1", "2", "3", "1"]
+    assert len(cache.store) == 2
+
+
+def test_ttl_expiry(monkeypatch):
+    now = 100.0
+    monkeypatch.setattr("seraphim.cache.time.monotonic", lambda: now)
+    store = LRUCache()
+    store.set("key", "value", ttl=10)
+
+    assert store.get("key") == "value"
+    now = 111.0
+    assert store.get("key") is None
+    assert len(store) == 0
+
+
+def test_asgi_cache(api, cache, calls, asgi_client):
+    assert asgi_client.get("/books?page=1").json() == {"page": "1"}
+    assert asgi_client.get("/books?page=1").json() == {"page": "1"}
+    assert calls == ["1"]
+    assert cache.hits == 1
+
+
+@pytest.mark.parametrize(
+    "header, value",
+    [
+        ("Set-Cookie", "session=abc"),
+        ("set-cookie", "session=abc"),
+        ("Cache-Control", "no-store"),
+        ("cache-control", "private"),
+    ],
+)
+def test_user_specific_responses_are_not_cached(api, cache, client, header, value):
+    calls = []
+
+    @api.route("/me", cache=60)
+    def me(req, resp):
+        calls.append(1)
+        resp.text = "me"
+        resp.headers[header] = value
+
+    client.get("http://testserver/me")
+    response = client.get("http://testserver/me")
+
+    assert response.headers[header] == value
+    assert len(calls) == 2
+    assert cache.hits == 0
+
+
+def test_lowercase_etag_is_used_for_conditional_get(api, cache, client):
+    @api.route("/tagged", cache=60)
+    def tagged(req, resp):
+        resp.text = "tagged"
+        resp.headers["etag"] = '"v1"'
+
+    first = client.get("http://testserver/tagged")
+    second = client.get("http://testserver/tagged", headers={"If-None-Match": '"v1"'})
+
+    assert first.headers["ETag"] == '"v1"'
+    assert second.status_code == 304
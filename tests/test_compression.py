@@ -0,0 +1,187 @@
+import gzip
+import json
+import os
+import zlib
+
+import pytest
+
+from seraphim import CacheMiddleware, GZipMiddleware
+from seraphim.compression import ENCODINGS, compress_stream, get_encodings, negotiate_encoding
+
+BOOKS = [{"id": index, "title": f"Book {index}"} for index in range(100)]
+GZIP = {"Accept-Encoding": "gzip, deflate"}
+IDENTITY = {"Accept-Encoding": "identity"}  # requests sends gzip by default
+
+
+@pytest.fixture
+def compression(api):
+    return api.add_middleware(GZipMiddleware, minimum_size=100, encodings=("gzip",))
+
+
+@pytest.fixture
+def routes(api):
+    @api.route("/books")
+    def books(req, resp):
+        resp.json = BOOKS
+
+    @api.route("/small")
+    def small(req, resp):
+        resp.text = "small"
+
+    @api.route("/image")
+    def image(req, resp):
+        resp.body = b"\x89PNG" * 100
+        resp.content_type = "image/png"
+
+    @api.route("/svg")
+    def svg(req, resp):
+        resp.body = b"<svg></svg>" * 100
+        resp.content_type = "image/svg+xml"
+
+    @api.route("/stream")
+    def stream(req, resp):
+        resp.json_stream = iter(BOOKS)
+
+
+def test_body_is_compressed(compression, routes, client):
+    response = client.get("http://testserver/books", headers=GZIP)
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert response.headers["Content-Length"] == str(len(response.content))
+    assert (
+        gzip.decompress(response.content)
+        == client.get("http://testserver/books", headers=IDENTITY).content
+    )
+
+
+def test_uncompressed_without_accept_encoding(compression, routes, client):
+    for headers in (IDENTITY, {"Accept-Encoding": ""}, {"Accept-Encoding": "gzip;q=0"}):
+        response = client.get("http://testserver/books", headers=headers)
+        assert "Content-Encoding" not in response.headers
+        assert response.headers["Vary"] == "Accept-Encoding"
+        assert response.json() == BOOKS
+
+
+def test_small_bodies_and_compressed_types_are_skipped(compression, routes, client):
+    for path in ("/small", "/image"):
+        response = client.get(f"http://testserver{path}", headers=GZIP)
+        assert "Content-Encoding" not in response.headers
+        assert "Vary" not in response.headers
+
+    response = client.get("http://testserver/svg", headers=GZIP)
+    assert response.headers["Content-Encoding"] == "gzip"
+
+
+def test_stream_is_compressed(compression, routes, client, asgi_client):
+    response = client.get("http://testserver/stream", headers=GZIP)
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Content-Length" not in response.headers
+    assert json.loads(gzip.decompress(response.content)) == BOOKS
+
+    response = asgi_client.get("/stream", headers=GZIP)
+    assert response.headers["content-encoding"] == "gzip"
+    assert json.loads(gzip.decompress(response.content)) == BOOKS
+
+
+def test_compress_stream_is_incremental():
+    consumed = []
+
+    def chunks():
+        for chunk in (b"first " * 50, b"second " * 50):
+            consumed.append(chunk)
+            yield chunk
+
+    stream = compress_stream(chunks(), ENCODINGS["gzip"](6))
+    decompressor = zlib.decompressobj(31)
+
+    assert decompressor.decompress(next(stream)) == b"first " * 50
+    assert len(consumed) == 1
+    assert decompressor.decompress(b"".join(stream)) == b"second " * 50
+    assert decompressor.eof
+
+
+def test_headers_are_merged(compression, api, client):
+    @api.route("/etag")
+    def etag(req, resp):
+        resp.text = "x" * 200
+        resp.headers["ETag"] = '"abc"'
+        resp.headers["Vary"] = "Cookie"
+
+    response = client.get("http://testserver/etag", headers=GZIP)
+    assert response.headers["ETag"] == 'W/"abc"'
+    assert response.headers["Vary"] == "Cookie, Accept-Encoding"
+
+
+def test_header_names_are_case_insensitive(compression, api, client):
+    payload = os.urandom(2000)  # stays over minimum_size once gzipped
+
+    @api.route("/encoded")
+    def encoded(req, resp):
+        resp.body = gzip.compress(payload)
+        resp.headers["content-encoding"] = "gzip"
+
+    @api.route("/no-transform")
+    def no_transform(req, resp):
+        resp.text = "x" * 2000
+        resp.headers["cache-control"] = "No-Transform"
+
+    @api.route("/etag")
+    def etag(req, resp):
+        resp.text = "x" * 2000
+        resp.headers["etag"] = '"abc"'
+        resp.headers["content-length"] = "2000"
+
+    response = client.get("http://testserver/encoded", headers=GZIP)
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(response.content) == payload  # compressed only once
+
+    response = client.get("http://testserver/no-transform", headers=GZIP)
+    assert "Content-Encoding" not in response.headers
+
+    response = client.get("http://testserver/etag", headers=GZIP)
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["ETag"] == 'W/"abc"'
+    assert gzip.decompress(response.content) == b"x" * 2000
+
+
+def test_cached_responses_are_stored_compressed(compression, routes, api, client):
+    cache = api.add_middleware(CacheMiddleware)
+
+    @api.route("/cached", cache=60)
+    def cached(req, resp):
+        resp.json = BOOKS
+
+    first = client.get("http://testserver/cached", headers=GZIP)
+    second = client.get("http://testserver/cached", headers=GZIP)
+    plain = client.get("http://testserver/cached", headers=IDENTITY)
+
+    assert cache.hits == 1
+    assert first.content == second.content
+    assert second.headers["Content-Encoding"] == "gzip"
+    assert "Content-Encoding" not in plain.headers
+    assert plain.json() == BOOKS
+    assert second.headers["Vary"] == "Accept-Encoding, Accept"
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("gzip", "gzip"),
+        ("br, gzip", "br"),
+        ("gzip;q=1.0, br;q=0.5", "gzip"),
+        ("br;q=0, *", "gzip"),
+        ("x-gzip", "gzip"),
+        ("identity", None),
+        ("", None),
+        ("gzip;q=bad", None),
+    ],
+)
+def test_negotiate_encoding(header, expected):
+    assert negotiate_encoding(header, ("br", "gzip")) == expected
+
+
+def test_get_encodings():
+    assert "gzip" in get_encodings()
+    with pytest.raises(ValueError):
+        get_encodings(("deflate",))
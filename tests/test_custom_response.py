@@ -1,3 +1,12 @@
+import json
+import sys
+
+import pytest
+
+from seraphim import API
+from seraphim.encoders import get_json_encoder, iter_json_array
+
+
 def test_json_response_helper(api, client):
     @api.route("/json")
     def json_handler(req, resp):
@@ -45,3 +54,89 @@ def test_manually_setting_body(api, client):
 
     assert "text/plain" in response.headers["Content-Type"]
     assert response.text == "Byte Body"
+
+
+def test_status_code_and_custom_headers(api, client):
+    @api.route("/created")
+    def created_handler(req, resp):
+        resp.status_code = 201
+        resp.headers["X-Book-Id"] = "42"
+        resp.json = {"id": 42}
+
+    response = client.get("http://testserver/created")
+
+    assert response.status_code == 201
+    assert response.headers["X-Book-Id"] == "42"
+    assert response.headers["Content-Length"] == str(len(response.content))
+    assert response.json() == {"id": 42}
+
+
+def test_json_stream_response(api, client):
+    @api.route("/books")
+    def books_handler(req, resp):
+        resp.json_stream = ({"id": i, "title": f"Book {i}"} for i in range(5000))
+
+    response = client.get("http://testserver/books")
+
+    assert response.headers["Content-Type"] == "application/json"
+    assert "Content-Length" not in response.headers
+    books = response.json()
+    assert len(books) == 5000
+    assert books[-1] == {"id": 4999, "title": "Book 4999"}
+
+
+def test_json_stream_is_chunked():
+    chunks = list(iter_json_array(({"id": i} for i in range(1000)), json.dumps, chunk_size=1024))
+
+    assert len(chunks) > 1
+    assert json.loads(b"".join(chunks)) == [{"id": i} for i in range(1000)]
+    assert list(iter_json_array([], json.dumps)) == [b"[]"]
+
+
+def test_custom_json_backend():
+    api = API(json_backend=lambda obj: json.dumps(obj, separators=(",", ":")))
+
+    @api.route("/json")
+    def json_handler(req, resp):
+        resp.json = {"name": "bubmo", "tags": ["a", "b"]}
+
+    assert api.test_session().get("http://testserver/json").text == (
+        '{"name":"bubmo","tags":["a","b"]}'
+    )
+
+
+def test_orjson_backend():
+    orjson = pytest.importorskip("orjson")
+    api = API(json_backend="orjson")
+    assert api.json_encoder is orjson.dumps
+
+    @api.route("/json")
+    def json_handler(req, resp):
+        resp.json_stream = [{"name": "bubmo"}, {"name": "bimbo"}]
+
+    response = api.test_session().get("http://testserver/json")
+    assert response.json() == [{"name": "bubmo"}, {"name": "bimbo"}]
+
+
+def test_unknown_json_backend():
+    with pytest.raises(ValueError):
+        API(json_backend="yaml")
+
+
+def test_auto_json_backend_falls_back_to_stdlib(monkeypatch):
+    monkeypatch.setitem(sys.modules, "orjson", None)
+    monkeypatch.setitem(sys.modules, "ujson", None)
+    assert get_json_encoder("auto") is json.dumps
+
+
+def test_no_content_response_has_no_body(api, client):
+    @api.route("/empty")
+    def empty(req, resp):
+        resp.status_code = 204
+        resp.text = "ignored"
+
+    response = client.get("http://testserver/empty")
+
+    assert response.status_code == 204
+    assert response.content == b""
+    assert "Content-Length" not in response.headers
@@ -0,0 +1,113 @@
+import pstats
+import time
+
+from seraphim import API
+from seraphim.instrumentation import Histogram, timer
+from seraphim.middleware import Middleware
+
+
+def _server_timing(header):
+    phases = {}
+    for entry in header.split(", "):
+        name, _, duration = entry.partition(";dur=")
+        phases[name] = float(duration)
+    return phases
+
+
+def test_server_timing_header_in_debug_mode():
+    api = API(templates_dir="example/templates", debug=True)
+
+    class Noop(Middleware):
+        def process_request(self, req):
+            pass
+
+        def process_response(self, req, resp):
+            pass
+
+    api.add_middleware(Noop)
+
+    @api.route("/books/{id:d}")
+    def book(req, resp, id):
+        resp.html = api.template("index.html", context={"title": "Book", "name": str(id)})
+
+    response = api.test_session().get("http://testserver/books/1")
+
+    phases = _server_timing(response.headers["Server-Timing"])
+    assert set(phases) == {
+        "Noop.request",
+        "route",
+        "handler",
+        "template",
+        "Noop.response",
+        "render",
+        "total",
+    }
+    assert phases["template"] <= phases["handler"] <= phases["total"]
+
+
+def test_no_server_timing_without_debug(api, client):
+    @api.route("/")
+    def index(req, resp):
+        resp.text = "hello"
+
+    assert "Server-Timing" not in client.get("http://testserver/").headers
+    assert api.instrumentation is None
+
+
+def test_route_histograms():
+    api = API(instrumentation=True)
+
+    @api.route("/books/{id}")
+    async def book(req, resp, id):
+        resp.text = id
+
+    client = api.test_session()
+    for id in range(10):
+        client.get(f"http://testserver/books/{id}")
+    client.get("http://testserver/missing")
+    api.asgi_test_client().get("/books/1")
+
+    summary = api.instrumentation.registry.summary()
+    assert set(summary) == {"/books/{id}", "<unmatched>"}
+    assert summary["/books/{id}"]["count"] == 11
+    assert 0 < summary["/books/{id}"]["p50"] <= summary["/books/{id}"]["p99"]
+    assert "Server-Timing" not in client.get("http://testserver/books/1").headers
+
+
+def test_histogram_percentiles():
+    histogram = Histogram(max_samples=100)
+    for value in range(1, 201):
+        histogram.observe(value / 1000)
+
+    summary = histogram.summary()
+    assert summary["count"] == 200
+    assert summary["p50"] == 0.151  # only the last 100 samples are kept
+    assert summary["p99"] == 0.199
+    assert summary["max"] == 0.2
+
+
+def test_timer_is_a_no_op_outside_of_requests():
+    with timer("anything"):
+        pass
+
+
+def test_slow_requests_are_profiled(tmp_path):
+    api = API(profile_threshold=0.02, profile_dir=str(tmp_path))
+
+    @api.route("/slow")
+    def slow(req, resp):
+        time.sleep(0.03)
+
+    @api.route("/fast")
+    def fast(req, resp):
+        pass
+
+    client = api.test_session()
+    client.get("http://testserver/fast")
+    client.get("http://testserver/slow")
+
+    profiles = list(tmp_path.iterdir())
+    assert len(profiles) == 1
+    assert "-GET-slow-" in profiles[0].name
+    stats = pstats.Stats(str(profiles[0]))
+    assert any(function == "slow" for _, _, function in stats.stats)
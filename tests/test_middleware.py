@@ -1,3 +1,4 @@
+from seraphim import Response
 from seraphim.middleware import Middleware
 
 
@@ -27,3 +28,129 @@ def test_middleware_methods_are_called(api, client):
 
     assert process_request_called is True
     assert process_response_called is True
+
+
+def test_middleware_order(api, client):
+    calls = []
+
+    def make_middleware(name):
+        class NamedMiddleware(Middleware):
+            def process_request(self, req):
+                calls.append(f"{name}.request")
+
+            def process_response(self, req, resp):
+                calls.append(f"{name}.response")
+
+        return NamedMiddleware
+
+    api.add_middleware(make_middleware("inner"))
+    api.add_middleware(make_middleware("outer"))
+
+    @api.route("/")
+    def index(req, resp):
+        calls.append("handler")
+        resp.text = "HELLO"
+
+    client.get("http://testserver/")
+
+    assert calls == [
+        "outer.request",
+        "inner.request",
+        "handler",
+        "inner.response",
+        "outer.response",
+    ]
+
+
+def test_pipeline_skips_no_op_hooks(api):
+    class RequestOnly(Middleware):
+        def process_request(self, req):
+            pass
+
+    class ResponseOnly(Middleware):
+        def process_response(self, req, resp):
+            pass
+
+    api.add_middleware(RequestOnly)
+    api.add_middleware(ResponseOnly)
+
+    _, request_hooks, response_hooks = api.get_pipeline()
+    assert [type(hook.__self__) for _, hook in request_hooks] == [RequestOnly]
+    assert [type(hook.__self__) for _, hook in response_hooks] == [ResponseOnly]
+
+
+def test_pipeline_is_rebuilt_when_middleware_is_added(api, client):
+    calls = []
+
+    class LateMiddleware(Middleware):
+        def process_request(self, req):
+            calls.append("late")
+
+    @api.route("/")
+    def index(req, resp):
+        resp.text = "HELLO"
+
+    client.get("http://testserver/")
+    api.add_middleware(LateMiddleware)
+    client.get("http://testserver/")
+
+    assert calls == ["late"]
+
+
+def test_middleware_short_circuit(api, client):
+    calls = []
+
+    class Inner(Middleware):
+        def process_request(self, req):
+            calls.append("inner.request")
+
+        def process_response(self, req, resp):
+            calls.append("inner.response")
+
+    class Blocker(Middleware):
+        def process_request(self, req):
+            if req.headers.get("X-Block"):
+                resp = Response()
+                resp.status_code = 403
+                resp.text = "Blocked"
+                return resp
+
+    class Outer(Middleware):
+        def process_response(self, req, resp):
+            calls.append("outer.response")
+
+    api.add_middleware(Inner)
+    api.add_middleware(Blocker)
+    api.add_middleware(Outer)
+
+    @api.route("/")
+    def index(req, resp):
+        calls.append("handler")
+        resp.text = "HELLO"
+
+    response = client.get("http://testserver/", headers={"X-Block": "1"})
+
+    assert response.status_code == 403
+    assert response.text == "Blocked"
+    assert calls == ["outer.response"]
+
+
+def test_custom_handle_request_keeps_nested_chain(api, client):
+    calls = []
+
+    class Wrapping(Middleware):
+        def handle_request(self, request):
+            calls.append("before")
+            response = self.app.handle_request(request)
+            calls.append("after")
+            return response
+
+    api.add_middleware(Wrapping)
+
+    @api.route("/")
+    def index(req, resp):
+        resp.text = "HELLO"
+
+    assert client.get("http://testserver/").text == "HELLO"
+    assert calls == ["before", "after"]
+    assert api.get_pipeline()[1] is None
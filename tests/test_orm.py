@@ -1,4 +1,12 @@
 import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import pytest
+
+from seraphim import API, Column, Database, ForeignKey, Index, QueryCountMiddleware, Table
+from seraphim.orm import ForeignKeyProxy, current_query_stats, track_queries
 
 
 def test_create_db(db):
@@ -228,3 +236,780 @@ def test_delete_author(db, Author):
 
     db.delete(Author, id=1)
     assert db.get_by_id(Author, 1) is None
+
+
+#######################################
+# connections
+def test_connection_pragmas(db):
+    assert db.conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert db.conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+    assert db.conn.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+
+
+def test_custom_pragmas(tmp_path):
+    db = Database(str(tmp_path / "pragmas.db"), busy_timeout=100, pragmas={"cache_size": -4000})
+    assert db.conn.execute("PRAGMA busy_timeout").fetchone()[0] == 100
+    assert db.conn.execute("PRAGMA cache_size").fetchone()[0] == -4000
+    db.close()
+
+
+def test_thread_local_connections(db, Author):
+    db.create(Author)
+    db.save(Author(name="John Doe", age=23))
+
+    connections = {}
+    names = {}
+
+    def read(index):
+        connections[index] = db.conn
+        names[index] = db.get_by_id(Author, 1).name
+
+    threads = [threading.Thread(target=read, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert set(names.values()) == {"John Doe"}
+    assert len({id(conn) for conn in connections.values()}) == 4
+    assert db.conn not in connections.values()
+
+
+def test_thread_connections_are_closed_when_threads_exit(db, Author):
+    db.create(Author)
+    db.save(Author(name="John Doe", age=23))
+
+    def read():
+        db.get_by_id(Author, 1)
+
+    for _ in range(20):
+        thread = threading.Thread(target=read)
+        thread.start()
+        thread.join()
+
+    assert db._connections == {db.conn}
+
+
+def test_connection_pool(tmp_path, Author):
+    db = Database(str(tmp_path / "pool.db"), pool_size=2)
+    db.create(Author)
+    for i in range(10):
+        db.save(Author(name=f"Author {i}", age=i))
+
+    def count_authors(_):
+        return len(db.get_all(Author))
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        assert list(executor.map(count_authors, range(32))) == [10] * 32
+    assert len(db._connections) <= 2
+
+    with db.connection() as conn:
+        with db.connection() as nested:
+            assert nested is conn
+            assert db.conn is conn
+
+    with pytest.raises(RuntimeError):
+        db.conn
+    db.close()
+
+
+def test_connection_pool_timeout(tmp_path):
+    db = Database(str(tmp_path / "pool.db"), pool_size=1, pool_timeout=0.01)
+    acquired = threading.Event()
+    release = threading.Event()
+
+    def hold_connection():
+        with db.connection():
+            acquired.set()
+            release.wait()
+
+    holder = threading.Thread(target=hold_connection)
+    holder.start()
+    acquired.wait()
+    try:
+        with pytest.raises(TimeoutError):
+            with db.connection():
+                pass
+    finally:
+        release.set()
+        holder.join()
+    db.close()
+
+
+def test_in_memory_database_is_shared_between_threads(Author):
+    db = Database(":memory:")
+    db.create(Author)
+    db.save(Author(name="John Doe", age=23))
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        assert executor.submit(lambda: db.get_by_id(Author, 1).name).result() == "John Doe"
+
+    db.conn.execute("UPDATE author SET age = 24")
+    assert db.get_by_id(Author, 1).age == 24
+    with db.connection() as conn:
+        assert db.conn is conn
+    db.close()
+
+
+#######################################
+# FK loading strategies
+@contextmanager
+def count_queries(db, prefix="SELECT"):
+    queries = []
+    db.conn.set_trace_callback(lambda sql: queries.append(sql) if sql.startswith(prefix) else None)
+    try:
+        yield queries
+    finally:
+        db.conn.set_trace_callback(None)
+
+
+@pytest.fixture
+def library(db, Author, Book):
+    db.create(Author)
+    db.create(Book)
+    authors = [Author(name=f"Author {i}", age=30 + i) for i in range(3)]
+    for author in authors:
+        db.save(author)
+    for i in range(30):
+        db.save(Book(title=f"Book {i}", published=i % 2 == 0, author=authors[i % 3]))
+    return authors
+
+
+def test_get_all_prefetches_foreign_keys(db, Book, library):
+    with count_queries(db) as queries:
+        books = db.get_all(Book)
+
+    assert len(queries) == 2
+    assert "FROM author WHERE id IN (" in queries[1]
+    assert [book.author.name for book in books[:4]] == [
+        "Author 0",
+        "Author 1",
+        "Author 2",
+        "Author 0",
+    ]
+    # every author row is hydrated once
+    assert books[0].author is books[3].author
+
+
+def test_select_related_uses_single_join(db, Book, library):
+    with count_queries(db) as queries:
+        books = db.get_all(Book, select_related=("author",))
+        book = db.get_by_id(Book, 5, select_related=("author",))
+        filtered = db.filter(Book, select_related=("author",), published=True)
+
+    assert len(queries) == 3
+    assert all("LEFT JOIN author AS t1 ON t0.author_id = t1.id" in sql for sql in queries)
+    assert len(books) == 30
+    assert books[4].author.name == "Author 1"
+    assert books[4].author.age == 31
+    assert book.title == "Book 4"
+    assert book.author.id == 2
+    assert len(filtered) == 15
+
+
+def test_select_related_rejects_non_foreign_keys(db, Book, library):
+    with pytest.raises(ValueError):
+        db.get_all(Book, select_related=("title",))
+
+
+def test_lazy_foreign_keys(db, Book, library):
+    with count_queries(db) as queries:
+        books = db.get_all(Book, lazy=True)
+        assert len(queries) == 1
+
+        author = books[1].author
+        assert isinstance(author, ForeignKeyProxy)
+        assert author.id == 2
+        assert len(queries) == 1
+
+        assert author.name == "Author 1"
+        assert author.name == "Author 1"
+        assert len(queries) == 2
+
+
+def test_lazy_with_prefetch_related(db, Book, library):
+    with count_queries(db) as queries:
+        books = db.get_all(Book, lazy=True, prefetch_related=("author",))
+        assert [book.author.name for book in books][:2] == ["Author 0", "Author 1"]
+
+    assert len(queries) == 2
+    assert not isinstance(books[0].author, ForeignKeyProxy)
+
+
+def test_nested_foreign_keys_are_prefetched_per_level(db):
+    class Publisher(Table):
+        name = Column(str)
+
+    class Writer(Table):
+        name = Column(str)
+        publisher = ForeignKey(Publisher)
+
+    class Story(Table):
+        title = Column(str)
+        writer = ForeignKey(Writer)
+
+    for table in (Publisher, Writer, Story):
+        db.create(table)
+    publisher = Publisher(name="Penguin")
+    db.save(publisher)
+    writers = [Writer(name=f"Writer {i}", publisher=publisher) for i in range(5)]
+    for writer in writers:
+        db.save(writer)
+    for i in range(20):
+        db.save(Story(title=f"Story {i}", writer=writers[i % 5]))
+
+    with count_queries(db) as queries:
+        stories = db.get_all(Story)
+        joined = db.get(Story).where(title="Story 7").select_related("writer").execute()
+
+    assert len(queries) == 3 + 2
+    assert stories[19].writer.publisher.name == "Penguin"
+    assert joined[0].writer.name == "Writer 2"
+    assert joined[0].writer.publisher.name == "Penguin"
+
+
+def test_select_related_prefetches_foreign_keys_of_joined_rows_in_one_batch(db):
+    class Publisher(Table):
+        name = Column(str)
+
+    class Writer(Table):
+        name = Column(str)
+        publisher = ForeignKey(Publisher)
+
+    class Story(Table):
+        title = Column(str)
+        writer = ForeignKey(Writer)
+
+    for table in (Publisher, Writer, Story):
+        db.create(table)
+    publishers = [Publisher(name=f"Publisher {i}") for i in range(10)]
+    db.bulk_save(publishers)
+    writers = [Writer(name=f"Writer {i}", publisher=publishers[i]) for i in range(10)]
+    db.bulk_save(writers)
+    db.bulk_save([Story(title=f"Story {i}", writer=writers[i % 10]) for i in range(30)])
+
+    with count_queries(db) as queries:
+        stories = db.get_all(Story, select_related=("writer",))
+    assert len(queries) == 2
+    assert [story.writer.publisher.name for story in stories[:3]] == [
+        "Publisher 0",
+        "Publisher 1",
+        "Publisher 2",
+    ]
+    assert stories[0].writer is stories[10].writer
+
+    with count_queries(db) as queries:
+        stories = db.get_all(Story, select_related=("writer",), lazy=True)
+    assert len(queries) == 1
+    assert isinstance(stories[0].writer._data["publisher"], ForeignKeyProxy)
+
+
+def test_query_object_loading_strategies(db, Book, library):
+    with count_queries(db) as queries:
+        books = (
+            db.get(Book)
+            .where(published=True)
+            .select_related("author")
+            .order_by("id", desc=True)
+            .limit(3)
+            .execute()
+        )
+
+    assert len(queries) == 1
+    assert [book.id for book in books] == [29, 27, 25]
+    assert [book.author.name for book in books] == ["Author 1", "Author 2", "Author 0"]
+    assert isinstance(db.get(Book).where(id=1).lazy().execute()[0].author, ForeignKeyProxy)
+
+
+def test_null_foreign_key(db, Book, library):
+    db.conn.execute("INSERT INTO book (title, published, author_id) VALUES ('Orphan', 0, NULL)")
+
+    assert db.filter(Book, title="Orphan")[0].author is None
+    assert db.filter(Book, select_related=("author",), title="Orphan")[0].author is None
+
+
+def test_table_schema_is_collected_once(db, Author, Book, monkeypatch):
+    assert Book._schema.fields == ["id", "author_id", "published", "title"]
+    assert [name for name, _ in Book._schema.foreign_keys] == ["author"]
+
+    def fail(*args, **kwargs):
+        raise AssertionError("inspect.getmembers must not be called per statement")
+
+    monkeypatch.setattr("inspect.getmembers", fail)
+    db.create(Author)
+    db.create(Book)
+    author = Author(name="John Doe", age=35)
+    db.save(author)
+    db.save(Book(title="Book", published=True, author=author))
+    book = db.get_by_id(Book, id=1)
+
+    assert book.author.name == "John Doe"
+    assert Book._get_select_where_sql(title="Book")[0] is Book._get_select_where_sql(title="x")[0]
+
+
+def test_bulk_save_update_delete(db, Author):
+    db.create(Author)
+    authors = [Author(name=f"Author {i}", age=i) for i in range(25)]
+
+    with count_queries(db, prefix="COMMIT") as commits:
+        db.bulk_save(authors, batch_size=10)
+
+    assert [author.id for author in authors] == list(range(1, 26))
+    assert len(commits) == 1
+    assert db.get_by_id(Author, id=25).name == "Author 24"
+
+    for author in authors:
+        author.age += 100
+    db.bulk_update(authors, batch_size=10)
+    assert [author.age for author in db.get_all(Author)] == list(range(100, 125))
+
+    db.bulk_delete(Author, [author.id for author in authors[:20]], batch_size=7)
+    assert [author.id for author in db.get_all(Author)] == [21, 22, 23, 24, 25]
+
+
+def test_transaction_defers_commits(db, Author):
+    db.create(Author)
+
+    with count_queries(db, prefix="COMMIT") as commits:
+        with db.transaction():
+            for i in range(5):
+                db.save(Author(name=f"Author {i}", age=i))
+            db.update(Author(id=1, name="Renamed", age=1))
+            db.delete(Author, id=2)
+
+    assert len(commits) == 1
+    assert [author.name for author in db.get_all(Author)][:2] == ["Renamed", "Author 2"]
+
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            db.save(Author(name="Lost", age=1))
+            raise RuntimeError
+    assert db.filter(Author, name="Lost") == []
+
+
+def test_nested_transactions_use_savepoints(db, Author):
+    db.create(Author)
+
+    with db.transaction():
+        db.save(Author(name="Outer", age=1))
+        with pytest.raises(ValueError):
+            with db.transaction():
+                db.save(Author(name="Inner", age=2))
+                raise ValueError
+        with db.transaction():
+            db.save(Author(name="Kept", age=3))
+
+    assert [author.name for author in db.get_all(Author)] == ["Outer", "Kept"]
+
+
+def test_iter_all_hydrates_in_chunks(db, Book, library):
+    with count_queries(db) as queries:
+        books = db.iter_all(Book, chunk_size=8)
+        assert queries == []  # nothing runs before the first row is requested
+
+        first = next(books)
+        assert first.title == "Book 0"
+        assert first.author.name == "Author 0"
+        assert len(queries) == 2
+
+        rest = list(books)
+
+    assert [book.id for book in rest] == list(range(2, 31))
+    # one select + one author prefetch per chunk of 8 rows
+    assert len(queries) == 1 + 4
+
+
+def test_query_object_iterate(db, Book, library):
+    books = (
+        db.get(Book).where(published=True).select_related("author").order_by("id", desc=True)
+    ).iterate(chunk_size=4)
+
+    titles = [(book.title, book.author.name) for book in books]
+
+    assert len(titles) == 15
+    assert titles[:2] == [("Book 28", "Author 1"), ("Book 26", "Author 2")]
+
+
+def test_closing_iterator_releases_pooled_connection(tmp_path, Author):
+    db = Database(str(tmp_path / "pool.db"), pool_size=1, pool_timeout=0.1)
+    with db.connection():
+        db.create(Author)
+        db.bulk_save([Author(name=f"Author {i}", age=i) for i in range(10)])
+
+    authors = db.iter_all(Author, chunk_size=3)
+    assert next(authors).id == 1
+    authors.close()
+
+    with db.connection():
+        assert len(db.get_all(Author)) == 10
+    db.close()
+
+
+def test_raw_rows(db, Book, library):
+    with count_queries(db) as queries:
+        books = db.get_all(Book, raw=True)
+
+    assert len(queries) == 1
+    assert len(books) == 30
+    assert books[0] == (1, 1, 1, "Book 0")
+    assert (books[1].id, books[1].author_id, books[1].title) == (2, 2, "Book 1")
+    assert type(books[0]) is Book._schema.row_class
+    assert not hasattr(books[0], "__dict__")
+
+    assert db.filter(Book, raw=True, title="Book 4")[0].author_id == 2
+    assert [book.id for book in db.iter_all(Book, chunk_size=7, raw=True)] == list(range(1, 31))
+
+
+def test_query_object_as_tuples(db, Book, library):
+    books = (
+        db.get(Book)
+        .where(published=False)
+        .select_related("author")
+        .order_by("id", desc=True)
+        .limit(2)
+        .as_tuples()
+    )
+
+    assert [tuple(book) for book in books.execute()] == [
+        (30, 3, 0, "Book 29"),
+        (28, 1, 0, "Book 27"),
+    ]
+    assert [book.title for book in books.iterate(chunk_size=1)] == ["Book 29", "Book 27"]
+
+
+def test_filter_lookups(db, Author, Book, library):
+    assert [a.name for a in db.filter(Author, age__gt=30)] == ["Author 1", "Author 2"]
+    assert [a.id for a in db.filter(Author, age__gte=31, age__lt=32)] == [2]
+    assert [a.id for a in db.filter(Author, age__lte=30)] == [1]
+    assert [a.id for a in db.filter(Author, name__ne="Author 1")] == [1, 3]
+    assert [a.id for a in db.filter(Author, name__like="%or 2")] == [3]
+    assert [a.id for a in db.filter(Author, id__in=[1, 3])] == [1, 3]
+    assert db.filter(Author, id__in=[]) == []
+    assert len(db.filter(Book, author=library[0])) == 10
+    assert len(db.filter(Book, author__in=library[1:])) == 20
+    assert len(db.filter(Book, author__isnull=False, published=True)) == 15
+    assert Author._get_select_where_sql(name=None, age__ne=None, id__in=[1, 2]) == (
+        "SELECT id, age, name FROM author WHERE name IS NULL AND age IS NOT NULL AND id IN (?, ?)",
+        ["id", "age", "name"],
+        [1, 2],
+    )
+
+
+def test_filter_rejects_unknown_columns_and_lookups(db, Author):
+    with pytest.raises(ValueError):
+        db.filter(Author, **{"name; DROP TABLE author": 1})
+    with pytest.raises(ValueError):
+        db.filter(Author, age__between=(1, 2))
+    with pytest.raises(ValueError):
+        db.get(Author).order_by("age; DROP TABLE author")
+
+
+def test_query_object_without_where(db, Author, library):
+    assert [author.id for author in db.get(Author).order_by("age", desc=True).execute()] == [
+        3,
+        2,
+        1,
+    ]
+
+
+def test_query_object_only(db, Book, library):
+    with count_queries(db) as queries:
+        books = db.get(Book).only("title").where(id__lte=2).execute()
+        rows = db.get(Book).only("id", "title", "author").where(id=3).as_tuples().execute()
+
+    assert queries[0] == "SELECT id, title FROM book WHERE id <= 2"
+    assert len(queries) == 2  # authors aren't prefetched for projections without them
+    assert [book.title for book in books] == ["Book 0", "Book 1"]
+    assert rows == [(3, "Book 2", 3)]
+    assert rows[0]._fields == ("id", "title", "author_id")
+
+
+def test_query_object_distinct_count_exists(db, Book, library):
+    query = db.get(Book).only("author").distinct().order_by("author").as_tuples()
+    assert query.execute() == [(1,), (2,), (3,)]
+    assert query.count() == 3
+    assert db.get(Book).where(published=True).count() == 15
+    assert db.get(Book).where(published=True).limit(4).count() == 4
+    assert db.get(Book).only("published").distinct().count() == 2
+    with pytest.raises(ValueError):
+        db.get(Book).only("published").distinct().execute()
+
+    with count_queries(db) as queries:
+        assert db.get(Book).where(title__like="Book 2%").exists()
+        assert not db.get(Book).where(title="Missing").exists()
+    assert all(query.startswith("SELECT EXISTS") for query in queries)
+
+
+def test_query_object_offset_and_keyset_pagination(db, Book, library):
+    query = db.get(Book).order_by("id").limit(5)
+    assert [book.id for book in query.offset(10).execute()] == [11, 12, 13, 14, 15]
+    assert [book.id for book in db.get(Book).offset(28).execute()] == [29, 30]
+
+    page = db.get(Book).where(published=True).limit(4).execute()
+    pages = [[book.id for book in page]]
+    while page:
+        page = db.get(Book).where(published=True).after(page[-1].id).limit(4).execute()
+        pages.append([book.id for book in page])
+    assert pages == [[1, 3, 5, 7], [9, 11, 13, 15], [17, 19, 21, 23], [25, 27, 29], []]
+
+    desc = db.get(Book).order_by("id", desc=True).after(5).limit(3).execute()
+    assert [book.id for book in desc] == [4, 3, 2]
+
+
+def test_column_constraints_and_indexes(db, Author):
+    class Article(Table):
+        slug = Column(str, unique=True, nullable=False)
+        title = Column(str, index=True)
+        views = Column(int)
+        published = Column(bool)
+        author = ForeignKey(Author)
+
+        class Meta:
+            indexes = [Index("published", "views"), Index("author", "slug", unique=True)]
+
+    assert Article._get_create_sql() == (
+        "CREATE TABLE IF NOT EXISTS article (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "author_id INTEGER, published INTEGER, slug TEXT NOT NULL UNIQUE, title TEXT, views INTEGER)"
+    )
+    assert Article._get_create_indexes_sql() == [
+        "CREATE INDEX IF NOT EXISTS idx_article_author_id ON article (author_id)",
+        "CREATE INDEX IF NOT EXISTS idx_article_title ON article (title)",
+        "CREATE INDEX IF NOT EXISTS idx_article_published_views ON article (published, views)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_article_author_id_slug ON article (author_id, slug)",
+    ]
+    assert Author._get_create_indexes_sql() == []
+
+    db.create(Author)
+    db.create(Article)
+    db.create(Article)  # indexes are only created once
+    db.save(Article(slug="a", title="A", views=1, published=True, author=None))
+    with pytest.raises(sqlite3.IntegrityError):
+        db.save(Article(slug="a", title="B", views=1, published=True, author=None))
+    with pytest.raises(sqlite3.IntegrityError):
+        db.save(Article(slug=None, title="C", views=1, published=True, author=None))
+
+
+def test_explain_query_plan(db, Book, library):
+    plan = db.explain(db.get(Book).where(author=1))
+    assert any("USING INDEX idx_book_author_id" in step for step in plan)
+
+    plan = db.explain("SELECT * FROM book WHERE title = ?", ["Book 1"])
+    assert any(step.startswith("SCAN book") for step in plan)
+
+
+def test_compiled_queries_are_cached(db, Book, library):
+    for author_id in (1, 2, 3):
+        books = db.get(Book).where(author=author_id).order_by("title").limit(2).execute()
+        assert len(books) == 2
+
+    info = db._compile_query.cache_info()
+    assert (info.misses, info.hits) == (1, 2)
+
+
+def test_cached_statements(tmp_path):
+    db = Database(str(tmp_path / "statements.db"), cached_statements=4)
+    assert db.cached_statements == 4
+    db.close()
+
+
+def test_query_result_cache(db, Author, Book, library):
+    query = db.get(Book).where(published=True).cache(ttl=60)
+
+    with count_queries(db) as queries:
+        first = query.execute()
+        second = db.get(Book).where(published=True).cache(ttl=60).execute()
+        uncached = db.get(Book).where(published=True).execute()
+    assert len(queries) == 2 + 2
+    assert [(book.id, book.title) for book in first] == [(book.id, book.title) for book in second]
+    assert len(uncached) == 15
+
+    # every hit builds its own instances => unsaved edits don't leak to other callers
+    first[0].title = "Mutated"
+    first[0].author.name = "Mutated"
+    third = query.execute()
+    assert third[0] is not first[0]
+    assert (third[0].title, third[0].author.name) == ("Book 0", "Author 0")
+
+    # and the identity map of a session applies to cached results too
+    with db.session():
+        with count_queries(db) as queries:
+            cached = query.execute()
+            assert db.get_by_id(Book, cached[0].id) is cached[0]
+        assert queries == []
+
+    # writes to the table or to a table it loads FKs from invalidate its cached results
+    db.save(Book(title="New", published=True, author=library[0]))
+    assert len(query.execute()) == 16
+
+    library[0].name = "Renamed"
+    db.update(library[0])
+    with count_queries(db) as queries:
+        books = query.execute()
+    assert len(queries) == 2
+    assert books[0].author.name == "Renamed"
+
+    with db.transaction():
+        db.delete(Book, id=1)
+        assert len(query.execute()) == 15
+    assert len(query.execute()) == 15
+
+
+def test_session_identity_map(db, Author, Book, library):
+    with db.session():
+        with count_queries(db) as queries:
+            books = db.get_all(Book, lazy=True)
+            names = {book.author.name for book in books}
+            author = db.get_by_id(Author, 1)
+            filtered = db.filter(Book, author=1)
+
+    # 1 select + 1 query per distinct author + 1 filter (its authors are already mapped)
+    assert len(queries) == 1 + 3 + 1
+    assert names == {"Author 0", "Author 1", "Author 2"}
+    assert books[0].author is author  # the proxy was replaced by the mapped instance
+    assert filtered[0] is books[0]
+
+    # outside of a session every load builds its own instances
+    assert db.get_by_id(Author, 1) is not db.get_by_id(Author, 1)
+
+
+def test_session_update_and_delete(db, Author, Book, library):
+    with db.session() as identity_map:
+        author = db.get_by_id(Author, 1)
+        db.update(Author(id=1, name="Renamed", age=99))
+        assert author.name == "Renamed"
+        assert db.get_by_id(Author, 1) is author
+
+        db.delete(Author, 1)
+        assert (Author, 1) not in identity_map
+        assert db.get_by_id(Author, 1) is None
+
+        new = Author(name="New", age=1)
+        db.save(new)
+        assert db.get_by_id(Author, new.id) is new
+
+
+def test_session_partial_instances_are_completed(db, Author, Book, library):
+    with db.session():
+        partial = db.get(Author).where(id=1).only("name").execute()[0]
+        with count_queries(db) as queries:
+            author = db.get_by_id(Author, 1)
+            books = db.filter(Book, author=1)
+        assert len(queries) == 2  # neither the get_by_id nor the FK prefetch reuse it as is
+
+        assert author is partial
+        assert (author.name, author.age) == ("Author 0", 30)
+        assert books[0].author is author
+        assert db.get_by_id(Author, 1) is author
+
+
+def test_columns_ending_in_id_are_not_foreign_keys(db, Author):
+    class Account(Table):
+        external_id = Column(str)
+        owner = ForeignKey(Author)
+
+    db.create(Author)
+    db.create(Account)
+    db.save(Author(name="John Doe", age=23))
+    db.save(Account(external_id="acc-1", owner=db.get_by_id(Author, 1)))
+
+    account = db.get_by_id(Account, 1)
+    assert account.external_id == "acc-1"
+    assert account.owner.name == "John Doe"
+    with db.session():
+        partial = db.get(Account).only("external_id").execute()[0]
+        assert db.get_by_id(Account, 1) is partial
+        assert (partial.external_id, partial.owner.id) == ("acc-1", 1)
+
+
+def test_session_references_are_weak(db, Author, library):
+    with db.session() as identity_map:
+        db.get_all(Author)
+        assert len(identity_map) == 0
+        authors = db.get_all(Author)
+        assert len(identity_map) == 3
+        del authors
+        assert len(identity_map) == 0
+
+
+def test_assert_num_queries(db, Author, Book, library):
+    with db.assert_num_queries(2):
+        db.get_all(Book)
+
+    with pytest.raises(AssertionError, match="Expected 1 queries, got 31"):
+        with db.assert_num_queries(1):
+            for book in db.get_all(Book, lazy=True):
+                book.author.name
+
+
+def test_queries_are_recorded(db, Author):
+    records = []
+    db.query_listeners.append(records.append)
+    db.create(Author)
+    db.bulk_save([Author(name=f"Author {i}", age=i) for i in range(3)])
+    db.get_all(Author)
+    db.get_by_id(Author, 2)
+
+    assert [(record.sql[:6], record.params, record.rows) for record in records[-4:]] == [
+        ("INSERT", 6, 3),  # 2 params per row
+        ("SELECT", 0, 1),  # last_insert_rowid()
+        ("SELECT", 0, 3),
+        ("SELECT", 1, 1),
+    ]
+    assert all(record.seconds >= 0 for record in records)
+
+
+def test_slow_query_log(db, Author, caplog):
+    db.create(Author)
+    db.slow_query_threshold = 0
+    with caplog.at_level("WARNING", logger="seraphim.orm"):
+        db.get_all(Author)
+
+    assert "Slow query" in caplog.text
+    assert "SELECT * FROM author" in caplog.text
+
+
+def test_query_count_middleware(db, Author, Book, library):
+    api = API(debug=True)
+    api.add_middleware(QueryCountMiddleware)
+    seen = []
+
+    @api.route("/books")
+    def books(req, resp):
+        resp.json = [book.author.name for book in db.get_all(Book)]
+        seen.append(current_query_stats().count)
+
+    response = api.test_session().get("http://testserver/books")
+
+    assert response.headers["X-Query-Count"] == "2"
+    assert float(response.headers["X-Query-Time"]) > 0
+    assert "db;dur=" in response.headers["Server-Timing"]
+    assert seen == [2]
+    assert current_query_stats() is None
+
+    asgi_response = api.asgi_test_client().get("/books")
+    assert asgi_response.headers["x-query-count"] == "2"
+
+    # the queries of a request count for an enclosing tracking block too
+    with db.assert_num_queries(2), track_queries() as outer:
+        assert api.test_session().get("http://testserver/books").headers["X-Query-Count"] == "2"
+    assert outer.count == 2
+    assert current_query_stats() is None
+
+
+def test_query_count_middleware_recovers_from_errors(db, Author, library):
+    api = API()
+    api.add_middleware(QueryCountMiddleware)
+
+    @api.route("/boom")
+    def boom(req, resp):
+        db.get_all(Author)
+        raise RuntimeError
+
+    # the next request starts from the stats that were current before the failed one
+    with track_queries() as outer:
+        with pytest.raises(RuntimeError):
+            api.test_session().get("http://testserver/boom")
+        assert current_query_stats() is not outer
+        api.test_session().get("http://testserver/missing")
+        assert current_query_stats() is outer
+    assert outer.count == 1
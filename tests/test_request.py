@@ -0,0 +1,122 @@
+import io
+
+from seraphim import Request
+from seraphim.request import UploadedFile
+
+
+def _environ(**overrides):
+    body = overrides.pop("body", b"")
+    environ = {
+        "REQUEST_METHOD": "GET",
+        "SCRIPT_NAME": "",
+        "PATH_INFO": "/books",
+        "QUERY_STRING": "",
+        "SERVER_NAME": "testserver",
+        "SERVER_PORT": "80",
+        "wsgi.url_scheme": "http",
+        "wsgi.input": io.BytesIO(body),
+    }
+    if body:
+        environ["CONTENT_LENGTH"] = str(len(body))
+    environ.update(overrides)
+    return environ
+
+
+def test_request_basic_attributes():
+    request = Request(_environ(QUERY_STRING="page=2", HTTP_HOST="example.com"))
+
+    assert request.method == "GET"
+    assert request.path == "/books"
+    assert request.host == "example.com"
+    assert request.url == "http://example.com/books?page=2"
+
+
+def test_request_path_is_decoded():
+    path_info = "/hello/жълт".encode().decode("latin1")
+    assert Request(_environ(PATH_INFO=path_info)).path == "/hello/жълт"
+
+
+def test_request_query_params():
+    request = Request(_environ(QUERY_STRING="page=2&tag=a&tag=b&empty="))
+
+    assert request.params == {"page": "2", "tag": "b", "empty": ""}
+    assert request.GET == request.params
+
+
+def test_request_headers_are_case_insensitive():
+    request = Request(
+        _environ(HTTP_ACCEPT_ENCODING="gzip", CONTENT_TYPE="application/json; charset=utf-8")
+    )
+
+    assert request.headers["accept-encoding"] == "gzip"
+    assert request.headers["Accept-Encoding"] == "gzip"
+    assert "content-type" in request.headers
+    assert "X-Missing" not in request.headers
+    assert request.headers.get("X-Missing") is None
+    assert set(request.headers) == {"Accept-Encoding", "Content-Type"}
+    assert request.content_type == "application/json"
+
+
+def test_request_cookies():
+    request = Request(_environ(HTTP_COOKIE="session=abc; theme=dark"))
+    assert request.cookies == {"session": "abc", "theme": "dark"}
+
+
+def test_request_body_is_read_lazily():
+    environ = _environ(REQUEST_METHOD="POST", body=b'{"title": "ORM"}')
+    request = Request(environ)
+
+    assert environ["wsgi.input"].tell() == 0
+    assert request.json == {"title": "ORM"}
+    assert request.text == '{"title": "ORM"}'
+
+
+def test_request_form_data():
+    request = Request(
+        _environ(
+            REQUEST_METHOD="POST",
+            CONTENT_TYPE="application/x-www-form-urlencoded",
+            body=b"title=ORM&year=1907",
+        )
+    )
+    assert request.POST == {"title": "ORM", "year": "1907"}
+
+
+def test_request_multipart_form_data():
+    data = bytes(range(256))
+    body = (
+        b"--BOUNDARY\r\n"
+        b'Content-Disposition: form-data; name="title"\r\n\r\n'
+        b"ORM\r\n"
+        b"--BOUNDARY\r\n"
+        b'Content-Disposition: form-data; name="cover"; filename="cover.png"\r\n'
+        b"Content-Type: image/png\r\n\r\n" + data + b"\r\n"
+        b"--BOUNDARY--\r\n"
+    )
+    request = Request(
+        _environ(
+            REQUEST_METHOD="POST",
+            CONTENT_TYPE="multipart/form-data; boundary=BOUNDARY",
+            body=body,
+        )
+    )
+
+    assert request.POST["title"] == "ORM"
+    cover = request.POST["cover"]
+    assert isinstance(cover, UploadedFile)
+    assert (cover.filename, cover.type, cover.value) == ("cover.png", "image/png", data)
+    assert cover.file.read() == data
+
+
+def test_request_params_combine_query_and_form():
+    request = Request(
+        _environ(
+            REQUEST_METHOD="POST",
+            QUERY_STRING="page=2&title=query",
+            CONTENT_TYPE="application/x-www-form-urlencoded",
+            body=b"title=form&year=1907",
+        )
+    )
+
+    assert request.GET == {"page": "2", "title": "query"}
+    assert request.params == {"page": "2", "title": "query", "year": "1907"}
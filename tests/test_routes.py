@@ -71,8 +71,48 @@ def test_class_based_handler_not_allowed_method(api, client):
         def post(self, req, resp):
             resp.text = "yolo"
 
-    with pytest.raises(AttributeError):
-        client.get("http://testserver/book")
+    response = client.get("http://testserver/book")
+    assert response.status_code == 405
+    assert response.text == "Method not allowed."
+    assert response.headers["Allow"] == "POST"
+
+
+def test_class_based_handler_instance_per_request(api, client):
+    created = 0
+
+    @api.route("/book")
+    class BookResource:
+        def __init__(self):
+            nonlocal created
+            created += 1
+
+        def get(self, req, resp):
+            resp.text = "book"
+
+    assert created == 0
+    client.get("http://testserver/book")
+    client.get("http://testserver/book")
+    assert created == 2
+
+
+def test_class_based_handler_singleton(api, client):
+    created = 0
+
+    @api.route("/book", singleton=True)
+    class BookResource:
+        def __init__(self):
+            nonlocal created
+            created += 1
+            self.hits = 0
+
+        def get(self, req, resp):
+            self.hits += 1
+            resp.text = str(self.hits)
+
+    assert created == 1
+    assert client.get("http://testserver/book").text == "1"
+    assert client.get("http://testserver/book").text == "2"
+    assert created == 1
 
 
 ####################
@@ -85,3 +125,64 @@ def test_alternative_route(api, client):
 
     api.add_route("/alternative", home)
     assert client.get("http://testserver/alternative").text == response_text
+
+
+####################
+# router
+def test_typed_route_param(api, client):
+    @api.route("/pow/{num:d}")
+    def pow_num(req, resp, num):
+        resp.text = f"{num**2} {type(num).__name__}"
+
+    assert client.get("http://testserver/pow/4").text == "16 int"
+    assert client.get("http://testserver/pow/four").status_code == 404
+
+
+def test_mixed_segment_route_param(api, client):
+    @api.route("/files/{name}.txt")
+    def file_handler(req, resp, name):
+        resp.text = name
+
+    assert client.get("http://testserver/files/notes.txt").text == "notes"
+    assert client.get("http://testserver/files/notes.csv").status_code == 404
+
+
+def test_nested_route_params(api, client):
+    @api.route("/authors/{author_id:d}/books/{title}")
+    def book_handler(req, resp, author_id, title):
+        resp.json = {"author_id": author_id, "title": title}
+
+    assert client.get("http://testserver/authors/7/books/orm").json() == {
+        "author_id": 7,
+        "title": "orm",
+    }
+    assert client.get("http://testserver/authors/7/books").status_code == 404
+    assert client.get("http://testserver/authors/7/books/orm/extra").status_code == 404
+
+
+def test_first_registered_route_wins(api):
+    @api.route("/{name}")
+    def hello(req, resp, name):
+        resp.text = name
+
+    @api.route("/home")
+    def home(req, resp):
+        resp.text = "HOME"
+
+    handler_data, kwargs = api.find_handler("/home")
+    assert handler_data["handler"] is hello
+    assert kwargs == {"name": "home"}
+
+
+def test_static_route_registered_first_wins(api):
+    @api.route("/home")
+    def home(req, resp):
+        resp.text = "HOME"
+
+    @api.route("/{name}")
+    def hello(req, resp, name):
+        resp.text = name
+
+    assert api.find_handler("/home") == (api.routes["/home"], {})
+    assert api.find_handler("/other") == (api.routes["/{name}"], {"name": "other"})
+    assert api.find_handler("/") == (None, None)
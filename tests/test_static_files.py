@@ -1,4 +1,8 @@
+import gzip
+
 from seraphim.api import API
+from seraphim.middleware import Middleware
+from seraphim.static import main
 
 FILE_DIR = "css"
 FILE_NAME = "main.css"
@@ -25,3 +29,104 @@ def test_assets_are_served(tmpdir_factory, client):
     response = client.get(f"http://testserver/static/{FILE_DIR}/{FILE_NAME}")
     assert response.status_code == 200
     assert response.text == FILE_CONTENTS
+
+
+def test_static_url_is_configurable(tmpdir_factory):
+    static_dir = tmpdir_factory.mktemp("static")
+    _create_static(static_dir)
+    api = API(static_dir=str(static_dir), static_url="/assets")
+    client = api.test_session()
+
+    assert client.get(f"http://testserver/assets/{FILE_DIR}/{FILE_NAME}").text == FILE_CONTENTS
+    assert client.get(f"http://testserver/static/{FILE_DIR}/{FILE_NAME}").status_code == 404
+
+
+def test_static_files_skip_middlewares(tmpdir_factory):
+    static_dir = tmpdir_factory.mktemp("static")
+    _create_static(static_dir)
+    api = API(static_dir=str(static_dir))
+    seen = []
+
+    class Recorder(Middleware):
+        def process_request(self, req):
+            seen.append(req.path)
+
+    api.add_middleware(Recorder)
+    client = api.test_session()
+
+    assert client.get(f"http://testserver/static/{FILE_DIR}/{FILE_NAME}").status_code == 200
+    assert client.get("http://testserver/static/missing.css").status_code == 404
+    assert seen == ["/static/missing.css"]
+
+
+def test_files_are_indexed_at_startup(tmpdir_factory):
+    static_dir = tmpdir_factory.mktemp("static")
+    api = API(static_dir=str(static_dir))
+    client = api.test_session()
+    _create_static(static_dir)
+
+    url = f"http://testserver/static/{FILE_DIR}/{FILE_NAME}"
+    assert client.get(url).status_code == 404
+    api.static.scan()
+    assert client.get(url).status_code == 200
+
+
+def test_precompressed_variant_is_served(tmpdir_factory):
+    static_dir = tmpdir_factory.mktemp("static")
+    contents = FILE_CONTENTS * 100
+    static_dir.join("big.css").write(contents)
+    api = API(static_dir=str(static_dir))
+
+    written = api.compress_static(use_brotli=False)
+    assert written == [str(static_dir.join("big.css.gz"))]
+
+    client = api.test_session()
+    response = client.get("http://testserver/static/big.css", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert gzip.decompress(response.content).decode() == contents
+
+    response = client.get(
+        "http://testserver/static/big.css", headers={"Accept-Encoding": "identity"}
+    )
+    assert "Content-Encoding" not in response.headers
+    assert response.text == contents
+
+    # siblings are never served as files of their own
+    assert client.get("http://testserver/static/big.css.gz").status_code == 404
+
+
+def test_compress_static_cli(tmpdir_factory):
+    static_dir = tmpdir_factory.mktemp("static")
+    static_dir.join("big.css").write(FILE_CONTENTS * 100)
+    static_dir.join("logo.png").write(FILE_CONTENTS * 100)
+
+    main([str(static_dir), "--no-brotli", "--quiet"])
+    assert static_dir.join("big.css.gz").check()
+    assert not static_dir.join("logo.png.gz").check()
+
+
+def test_hashed_files_are_immutable(tmpdir_factory):
+    static_dir = tmpdir_factory.mktemp("static")
+    static_dir.join("main.3f2a9c1b.css").write(FILE_CONTENTS)
+    static_dir.join("main.css").write(FILE_CONTENTS)
+    api = API(static_dir=str(static_dir), static_max_age=300)
+    client = api.test_session()
+
+    response = client.get("http://testserver/static/main.3f2a9c1b.css")
+    assert "immutable" in response.headers["Cache-Control"]
+    response = client.get("http://testserver/static/main.css")
+    assert response.headers["Cache-Control"] == "max-age=300, public"
+
+
+def test_not_modified(tmpdir_factory):
+    static_dir = tmpdir_factory.mktemp("static")
+    _create_static(static_dir)
+    api = API(static_dir=str(static_dir))
+    client = api.test_session()
+    url = f"http://testserver/static/{FILE_DIR}/{FILE_NAME}"
+
+    etag = client.get(url).headers["ETag"]
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
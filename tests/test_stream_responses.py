@@ -0,0 +1,166 @@
+import io
+
+import pytest
+
+from seraphim import Response
+
+FILE_CONTENTS = b"0123456789" * 10_000
+
+
+@pytest.fixture
+def export_file(tmp_path):
+    path = tmp_path / "export.csv"
+    path.write_bytes(FILE_CONTENTS)
+    return path
+
+
+@pytest.fixture
+def file_api(api, export_file):
+    @api.route("/export")
+    def export(req, resp):
+        resp.file = export_file
+
+    return api
+
+
+def test_stream_response(api, client):
+    @api.route("/stream")
+    def stream_handler(req, resp):
+        resp.content_type = "text/csv"
+        resp.stream = (f"row {i}\n".encode() for i in range(1000))
+
+    response = client.get("http://testserver/stream")
+
+    assert "text/csv" in response.headers["Content-Type"]
+    assert "Content-Length" not in response.headers
+    assert response.text.splitlines()[-1] == "row 999"
+
+
+def test_file_response(file_api, client):
+    response = client.get("http://testserver/export")
+
+    assert response.status_code == 200
+    assert response.content == FILE_CONTENTS
+    assert "text/csv" in response.headers["Content-Type"]
+    assert response.headers["Content-Length"] == str(len(FILE_CONTENTS))
+    assert response.headers["Accept-Ranges"] == "bytes"
+    assert response.headers["ETag"]
+    assert response.headers["Last-Modified"]
+
+
+def test_file_response_conditional_get(file_api, client):
+    response = client.get("http://testserver/export")
+
+    etag = response.headers["ETag"]
+    cached = client.get("http://testserver/export", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+
+    last_modified = response.headers["Last-Modified"]
+    cached = client.get("http://testserver/export", headers={"If-Modified-Since": last_modified})
+    assert cached.status_code == 304
+
+    stale = client.get("http://testserver/export", headers={"If-None-Match": '"other"'})
+    assert stale.status_code == 200
+
+
+@pytest.mark.parametrize(
+    "range_header, content_range, expected",
+    [
+        ("bytes=0-9", "bytes 0-9/100000", FILE_CONTENTS[:10]),
+        ("bytes=99990-", "bytes 99990-99999/100000", FILE_CONTENTS[99990:]),
+        ("bytes=-5", "bytes 99995-99999/100000", FILE_CONTENTS[-5:]),
+        ("bytes=99998-200000", "bytes 99998-99999/100000", FILE_CONTENTS[99998:]),
+    ],
+)
+def test_file_response_range(file_api, client, range_header, content_range, expected):
+    response = client.get("http://testserver/export", headers={"Range": range_header})
+
+    assert response.status_code == 206
+    assert response.headers["Content-Range"] == content_range
+    assert response.headers["Content-Length"] == str(len(expected))
+    assert response.content == expected
+
+
+def test_file_response_unsatisfiable_range(file_api, client):
+    response = client.get("http://testserver/export", headers={"Range": "bytes=200000-"})
+
+    assert response.status_code == 416
+    assert response.headers["Content-Range"] == "bytes */100000"
+
+
+def test_file_response_if_range_mismatch_sends_full_file(file_api, client):
+    response = client.get(
+        "http://testserver/export", headers={"Range": "bytes=0-9", "If-Range": '"stale"'}
+    )
+
+    assert response.status_code == 200
+    assert response.content == FILE_CONTENTS
+
+
+def test_file_response_uses_wsgi_file_wrapper(export_file):
+    wrapped = []
+
+    def file_wrapper(file, block_size):
+        wrapped.append(file)
+        return iter(lambda: file.read(block_size), b"")
+
+    response = Response()
+    response.file = str(export_file)
+    body = response({"REQUEST_METHOD": "GET", "wsgi.file_wrapper": file_wrapper}, _start_response)
+
+    assert b"".join(body) == FILE_CONTENTS
+    assert len(wrapped) == 1
+
+
+def test_file_object_response(api, client):
+    @api.route("/report")
+    def report(req, resp):
+        resp.content_type = "text/plain"
+        resp.file = io.BytesIO(b"in-memory report")
+
+    response = client.get("http://testserver/report")
+
+    assert response.text == "in-memory report"
+    assert response.headers["Content-Length"] == "16"
+    assert "ETag" not in response.headers
+
+
+def test_asgi_stream_and_file_responses(file_api, asgi_client):
+    @file_api.route("/stream")
+    def stream_handler(req, resp):
+        resp.stream = (b"chunk" for _ in range(3))
+
+    assert asgi_client.get("/stream").content == b"chunkchunkchunk"
+    assert asgi_client.get("/export").content == FILE_CONTENTS
+    partial = asgi_client.get("/export", headers={"Range": "bytes=5-9"})
+    assert partial.status_code == 206
+    assert partial.content == b"56789"
+
+
+def _start_response(status, headers, exc_info=None):
+    pass
+
+
+def test_file_object_range_starts_at_its_position(api, client):
+    @api.route("/offset")
+    def offset(req, resp):
+        file = io.BytesIO(b"0123456789ABCDEFGHIJ")
+        file.seek(10)
+        resp.file = file
+
+    assert client.get("http://testserver/offset").content == b"ABCDEFGHIJ"
+    partial = client.get("http://testserver/offset", headers={"Range": "bytes=0-4"})
+    assert partial.status_code == 206
+    assert partial.content == b"ABCDE"
+
+
+def test_file_response_keeps_handler_status(file_api, client):
+    @file_api.route("/created")
+    def created(req, resp):
+        resp.status_code = 201
+        resp.file = io.BytesIO(FILE_CONTENTS)
+
+    response = client.get("http://testserver/created", headers={"Range": "bytes=0-4"})
+    assert response.status_code == 201
+    assert response.content == FILE_CONTENTS
@@ -1,3 +1,6 @@
+from seraphim import API
+
+
 def test_template(api, client):
     @api.route("/html")
     def html_handler(req, resp):
@@ -10,3 +13,44 @@ def test_template(api, client):
     assert "text/html" in response.headers["Content-Type"]
     assert "Some Title" in response.text
     assert "Some Name" in response.text
+
+
+def test_template_stream(api, client):
+    @api.route("/html")
+    def html_handler(req, resp):
+        resp.template_stream("index.html", {"title": "Streamed Title", "name": "Streamed Name"})
+
+    response = client.get("http://testserver/html")
+
+    assert "text/html" in response.headers["Content-Type"]
+    assert "Content-Length" not in response.headers
+    assert "Streamed Title" in response.text
+    assert "Streamed Name" in response.text
+
+
+def test_template_async(api, asgi_client):
+    @api.route("/html")
+    async def html_handler(req, resp):
+        resp.html = await api.template_async("index.html", {"title": "Async Title"})
+
+    assert "Async Title" in asgi_client.get("/html").text
+
+
+def test_precompile_templates(tmp_path):
+    templates_dir = tmp_path / "templates"
+    templates_dir.mkdir()
+    (templates_dir / "index.html").write_text("<h1>{{ title }}</h1>")
+    (templates_dir / "books.html").write_text("{% for b in books %}{{ b }}{% endfor %}")
+    api = API(
+        templates_dir=str(templates_dir),
+        templates_auto_reload=False,
+        templates_bytecode_cache_dir=str(tmp_path / "bytecode"),
+    )
+
+    assert api.precompile_templates() == ["books.html", "index.html"]
+    assert len(api.templates_env.cache) == 2
+    assert len(list((tmp_path / "bytecode").iterdir())) == 2
+
+    # auto_reload is off -> the compiled template keeps being used
+    (templates_dir / "index.html").write_text("<h2>{{ title }}</h2>")
+    assert api.template("index.html", {"title": "Cached"}) == "<h1>Cached</h1>"